@@ -0,0 +1,373 @@
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import random
+import shutil
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+import dnsprobe
+import registry
+import monitoring
+import monitoring_linux
+import reachability
+
+# Benchmarks for the Linux collectors, page rendering and the HTTP path.
+# Collectors read a procfs fixture (generated, or recorded from a live
+# host with --record), and the network checks talk to local stand-ins, so
+# a run needs neither root nor a network connection.
+#
+#   python3 bench.py                      # run, print JSON results
+#   python3 bench.py --check              # also exit 1 on a regression
+#   python3 bench.py --record fixture/    # snapshot this host's /proc
+#   python3 bench.py --fixture fixture/   # run against a recorded one
+
+THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_thresholds.json")
+
+# Size of the generated fixture
+PROCESSES = 300
+LISTENERS = 40
+CONNECTIONS = 500
+
+RENDER_ROWS = (10, 1000, 10000)
+
+
+# --- Fixtures ---
+
+def _hex_address(ip, port):
+    # Inverse of monitoring_linux._decode_address for IPv4
+    word = struct.unpack("=I", socket.inet_aton(ip))[0]
+    return f"{word:08X}:{port:04X}"
+
+def _write(root, path, content):
+    path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+def generate_fixture(root, seed=1):
+    # A plausible busy Pi: PROCESSES processes, LISTENERS listening sockets
+    # owned by some of them and CONNECTIONS established connections
+    rnd = random.Random(seed)
+    proc = os.path.join(root, "proc")
+    _write(proc, "uptime", "123456.78 400000.00\n")
+    _write(proc, "loadavg", "0.52 0.48 0.40 2/312 4242\n")
+    _write(proc, "meminfo", "MemTotal: 8142000 kB\nMemFree: 2100000 kB\nMemAvailable: 5900000 kB\n"
+                            "SwapTotal: 102396 kB\nSwapFree: 102396 kB\n")
+    cpus = [f"cpu{i} {rnd.randint(10**5, 10**6)} 0 {rnd.randint(10**4, 10**5)} {rnd.randint(10**6, 10**7)} 500 0 100 0 0 0"
+            for i in range(4)]
+    _write(proc, "stat", "cpu  4000000 0 400000 40000000 2000 0 400 0 0 0\n" + "\n".join(cpus) +
+           "\nintr 1 2 3\nctxt 123456\nbtime 1700000000\n")
+    _write(proc, "diskstats", "   179       0 mmcblk0 52000 1000 4000000 30000 21000 9000 1600000 90000 0 80000 120000\n"
+                              "   179       1 mmcblk0p1 300 0 9000 200 2 0 4 0 0 100 200\n"
+                              "     7       0 loop0 10 0 20 0 0 0 0 0 0 0 0\n")
+    _write(proc, "net/dev", "Inter-|   Receive\n face |bytes packets\n"
+                            "    lo: 1000 10 0 0 0 0 0 0 1000 10 0 0 0 0 0 0\n"
+                            "  eth0: 987654321 765432 0 0 0 0 0 0 123456789 234567 0 0 0 0 0 0\n"
+                            " wlan0: 12345 67 0 0 0 0 0 0 8901 23 0 0 0 0 0 0\n")
+    os.makedirs(os.path.join(root, "sys", "block", "mmcblk0"), exist_ok=True)
+    _write(root, "sys/class/thermal/thermal_zone0/type", "cpu-thermal\n")
+    _write(root, "sys/class/thermal/thermal_zone0/temp", "51850\n")
+
+    header = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+    tcp = []
+    inode = 10000
+    owners = {}  # pid -> socket inodes
+    pids = rnd.sample(range(2, 40000), PROCESSES)
+    for n in range(LISTENERS):
+        inode += 1
+        ip = rnd.choice(["0.0.0.0", "127.0.0.1", "192.168.1.20"])
+        tcp.append(f"{n}: {_hex_address(ip, 1000 + n * 7)} 00000000:0000 0A 00000000:00000000 00:00000000 00000000 0 0 {inode}")
+        owners.setdefault(rnd.choice(pids), []).append(inode)
+    for n in range(CONNECTIONS):
+        inode += 1
+        local = _hex_address("192.168.1.20", 1000 + rnd.randrange(LISTENERS) * 7)
+        peer = _hex_address(f"192.168.1.{rnd.randint(30, 90)}", rnd.randint(32768, 60999))
+        state = rnd.choice(["01"] * 8 + ["06", "08"])
+        tcp.append(f"{LISTENERS + n}: {local} {peer} {state} 00000000:00000000 00:00000000 00000000 0 0 {inode}")
+    _write(proc, "net/tcp", header + "\n".join(tcp) + "\n")
+    for name in ("tcp6", "udp", "udp6"):
+        _write(proc, f"net/{name}", header)
+
+    for pid in pids:
+        comm = rnd.choice(["python3", "nginx", "sshd", "containerd", "dockerd", "node", "postgres", "kworker/0:1"])
+        fields = ["S"] + ["0"] * 49
+        fields[11], fields[12] = str(rnd.randint(0, 10**6)), str(rnd.randint(0, 10**5))
+        fields[19] = str(rnd.randint(100, 10**7))
+        fields[21] = str(rnd.randint(0, 60000))
+        _write(proc, f"{pid}/stat", f"{pid} ({comm}) " + " ".join(fields) + "\n")
+        _write(proc, f"{pid}/comm", comm + "\n")
+        fd_dir = os.path.join(proc, str(pid), "fd")
+        os.makedirs(fd_dir)
+        for fd, target in enumerate(["/dev/null", "pipe:[1]"] + [f"socket:[{i}]" for i in owners.get(pid, [])]):
+            os.symlink(target, os.path.join(fd_dir, str(fd)))
+    return root
+
+def record_fixture(root, proc_root="/proc", sys_root="/sys"):
+    # Copies what the Linux collectors read from this host
+    for name in ("uptime", "loadavg", "meminfo", "stat", "diskstats", "net/dev",
+                 "net/tcp", "net/tcp6", "net/udp", "net/udp6"):
+        try:
+            with open(os.path.join(proc_root, name)) as f:
+                _write(os.path.join(root, "proc"), name, f.read())
+        except OSError:
+            pass
+    for pid in os.listdir(proc_root):
+        if not pid.isdigit(): continue
+        try:
+            with open(os.path.join(proc_root, pid, "stat")) as f:
+                stat = f.read()
+            with open(os.path.join(proc_root, pid, "comm")) as f:
+                comm = f.read()
+        except OSError:
+            continue
+        _write(os.path.join(root, "proc"), f"{pid}/stat", stat)
+        _write(os.path.join(root, "proc"), f"{pid}/comm", comm)
+        fd_dir = os.path.join(root, "proc", pid, "fd")
+        os.makedirs(fd_dir, exist_ok=True)
+        try:
+            for fd in os.listdir(os.path.join(proc_root, pid, "fd")):
+                os.symlink(os.readlink(os.path.join(proc_root, pid, "fd", fd)), os.path.join(fd_dir, fd))
+        except OSError:
+            pass
+    thermal = os.path.join(sys_root, "class", "thermal")
+    for zone in (os.listdir(thermal) if os.path.isdir(thermal) else []):
+        for name in ("type", "temp"):
+            try:
+                with open(os.path.join(thermal, zone, name)) as f:
+                    _write(root, f"sys/class/thermal/{zone}/{name}", f.read())
+            except OSError:
+                pass
+    for disk in (os.listdir(os.path.join(sys_root, "block")) if os.path.isdir(os.path.join(sys_root, "block")) else []):
+        os.makedirs(os.path.join(root, "sys", "block", disk), exist_ok=True)
+
+
+# --- Local stand-ins for the network checks ---
+
+_keep = []
+
+def _tcp_target():
+    # A bound but not listening port: connects are refused at once, which
+    # the reachability probe counts as an answer, and nothing piles up in
+    # an accept queue
+    target = socket.socket()
+    target.bind(("127.0.0.1", 0))
+    _keep.append(target)
+    return target.getsockname()
+
+def _dns_server():
+    # Answers every A query with 192.0.2.1
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    record = struct.pack(">HHHIH4s", 0xc00c, 1, 1, 60, 4, socket.inet_aton("192.0.2.1"))
+
+    def answer():
+        while True:
+            data, peer = server.recvfrom(512)
+            server.sendto(data[:2] + struct.pack(">HHHHH", 0x8180, 1, 1, 0, 0) + data[12:] + record, peer)
+    threading.Thread(target=answer, daemon=True).start()
+    return server.getsockname()[1]
+
+
+# --- Measurement ---
+
+def measure(func, min_time=0.5, max_runs=2000):
+    # Repeats func for at least min_time seconds (and 5 runs)
+    times = []
+    started = time.perf_counter()
+    while len(times) < 5 or (time.perf_counter() - started < min_time and len(times) < max_runs):
+        t = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t)
+    times.sort()
+    return {
+        "runs": len(times),
+        "median_ms": round(times[len(times) // 2] * 1000, 3),
+        "p95_ms": round(times[int(len(times) * 0.95)] * 1000, 3),
+        "min_ms": round(times[0] * 1000, 3)
+    }
+
+def load_dashboard():
+    spec = importlib.util.spec_from_file_location("html_dashboard", os.path.join(os.path.dirname(os.path.abspath(__file__)), "html-dashboard.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def bench_collectors(fixture, results):
+    monitoring_linux.PROC_ROOT = os.path.join(fixture, "proc")
+    # Measure real scans, not the reuse window
+    monitoring_linux.SCAN_MAX_AGE = 0
+    system = monitoring_linux.SystemStats(os.path.join(fixture, "proc"), os.path.join(fixture, "sys"))
+    host, port = _tcp_target()
+    dns_port = _dns_server()
+    targets = [(host, port)]
+
+    benches = {
+        "get_listening_ports": monitoring_linux.get_listening_ports,
+        "get_top_processes": monitoring_linux.get_top_processes,
+        "get_top_cpu_processes": monitoring_linux.get_top_cpu_processes,
+        "get_uptime": monitoring_linux.get_uptime,
+        "get_connections": monitoring_linux.get_connections,
+        "get_interfaces": monitoring_linux.get_interfaces,
+        "get_system": system.sample,
+        # The local target answers at once, so this is the probe's own overhead
+        "check_network": lambda: reachability.probe(targets, count=1, timeout=1.0),
+        "check_dns": lambda: dnsprobe.probe(["127.0.0.1"], port=dns_port, timeout=1.0),
+    }
+    for name, func in benches.items():
+        results[f"collector.{name}"] = measure(func)
+    system.close()
+
+def fixture_results(fixture):
+    # One pass of every Linux probe over the fixture, as the collector
+    # would have published it
+    results = {name: probe.func() for name, probe in registry.available("linux").items()
+               if name not in ("ping", "resolvers")}
+    results["ping"] = {"reachable": True, "method": "icmp", "target": "8.8.8.8", "sent": 3, "received": 3,
+                       "loss": 0.0, "rtt_ms": 12.5}
+    results["resolvers"] = [{"server": "192.168.1.1", "name": "google.com", "ok": True, "rcode": "NOERROR", "ms": 8.1}]
+    return results
+
+def bench_render(dashboard, results, out):
+    health = monitoring.compose_health(results)
+    rnd = random.Random(2)
+    for rows in RENDER_ROWS:
+        ports = [{"protocol": rnd.choice(["tcp", "udp"]), "ip": "0.0.0.0", "port": 1000 + i, "family": "ipv4",
+                  "scope": "All Interfaces", "pid": 1000 + i, "process": "python3"} for i in range(rows)]
+        h = dict(health, processes=health["processes"] * max(1, rows // max(1, len(health["processes"]))))
+        out[f"render_html.{rows}_rows"] = measure(lambda: dashboard.render_html(h, ports), min_time=1.0, max_runs=200)
+
+def bench_http(dashboard, results, out, clients=8, duration=3.0):
+    # Serves the fixture snapshot; every client holds one keep-alive
+    # connection and requests as fast as it can
+    collector = dashboard.collector
+    for name, result in results.items():
+        collector._store(name, result)
+    collector.attempted = set(collector.probes)
+    server = dashboard.PooledHTTPServer(("127.0.0.1", 0), dashboard.Handler, workers=clients + 2, queue=clients * 2)
+    dashboard.Handler.log_message = lambda *args: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    for path, headers in (("/", {"Accept-Encoding": "gzip"}), ("/health", {}), ("/metrics", {}),
+                          ("/health", {"Accept": "application/msgpack", "Accept-Encoding": "gzip"})):
+        latencies = []
+        errors = []
+        deadline = time.perf_counter() + duration
+
+        def client():
+            conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+            mine = []
+            try:
+                while time.perf_counter() < deadline:
+                    t = time.perf_counter()
+                    conn.request("GET", path, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        errors.append(response.status)
+                    mine.append(time.perf_counter() - t)
+            except (OSError, http.client.HTTPException) as e:
+                errors.append(str(e))
+            finally:
+                conn.close()
+                latencies.extend(mine)
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        name = "http." + path.strip("/").replace("/", ".") if path != "/" else "http.page"
+        if "Accept" in headers:
+            name += ".msgpack"
+        out[name] = {
+            "clients": clients,
+            "requests": len(latencies),
+            "errors": len(errors),
+            "rps": round(len(latencies) / elapsed, 1),
+            "median_ms": round(latencies[len(latencies) // 2] * 1000, 3) if latencies else None,
+            "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 3) if latencies else None
+        }
+    server.shutdown()
+
+def check(results, thresholds):
+    # -> list of human readable regressions
+    failures = []
+    for name, limits in thresholds.items():
+        result = results.get(name)
+        if result is None:
+            continue
+        if "max_median_ms" in limits and result["median_ms"] > limits["max_median_ms"]:
+            failures.append(f"{name}: median {result['median_ms']} ms > {limits['max_median_ms']} ms")
+        if "min_rps" in limits and result["rps"] < limits["min_rps"]:
+            failures.append(f"{name}: {result['rps']} req/s < {limits['min_rps']} req/s")
+        if result.get("errors"):
+            failures.append(f"{name}: {result['errors']} failed requests")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the monitor's collectors, rendering and HTTP path")
+    parser.add_argument("--fixture", help="recorded fixture directory (default: generate one)")
+    parser.add_argument("--record", metavar="DIR", help="record this host's /proc into DIR and exit")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    parser.add_argument("--check", action="store_true", help="exit 1 if a result is worse than bench_thresholds.json")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent HTTP clients")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per HTTP benchmark")
+    parser.add_argument("--only", choices=["collectors", "render", "http"], help="run one group")
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixture(args.record)
+        print(f"Recorded fixture to {args.record}")
+        sys.exit(0)
+
+    tmp = None
+    fixture = args.fixture
+    if fixture is None:
+        tmp = fixture = generate_fixture(tempfile.mkdtemp(prefix="bench-fixture-"))
+
+    results = {}
+    try:
+        if args.only in (None, "collectors"):
+            bench_collectors(fixture, results)
+        monitoring_linux.PROC_ROOT = os.path.join(fixture, "proc")
+        monitoring_linux._system_stats = monitoring_linux.SystemStats(os.path.join(fixture, "proc"), os.path.join(fixture, "sys"))
+        snapshot = fixture_results(fixture)
+        if args.only in (None, "render", "http"):
+            dashboard = load_dashboard()
+        if args.only in (None, "render"):
+            bench_render(dashboard, snapshot, results)
+        if args.only in (None, "http"):
+            bench_http(dashboard, snapshot, results, args.clients, args.duration)
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "cpus": os.cpu_count(),
+        "fixture": "generated" if tmp else args.fixture,
+        "results": results
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if args.check:
+        with open(THRESHOLDS) as f:
+            failures = check(results, json.load(f))
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        sys.exit(1 if failures else 0)
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+
+import monitoring  # registers the probes
+import registry
+import stats
+
+# A result older than this many refresh intervals is reported as stale
+STALE_FACTOR = 3
+
+# Intervals are stretched while the monitor itself uses more than this
+# share of one core (percent), or the 1-minute load average per core is
+# above this, and tightened again once both are back under half of it
+CPU_BUDGET = float(os.environ.get("MONITOR_CPU_BUDGET", 2))
+LOAD_BUDGET = float(os.environ.get("MONITOR_LOAD_BUDGET", 1.0))
+# Largest stretch applied to the declared intervals
+MAX_BACKOFF = 8
+# How often the budget is checked (seconds)
+GOVERN_INTERVAL = 10
+# Weight of the newest run in the per-probe cost averages
+COST_SMOOTHING = 0.3
+
+
+class Collector:
+    # Every registered probe runs on its own thread at its own interval, so
+    # an expensive or stuck probe only ever delays itself
+    def __init__(self, probes=None):
+        self.probes = probes if probes is not None else registry.available()
+        self.cond = threading.Condition()
+        self.results = {}
+        self.updated = {}
+        self.attempted = set()
+        self.running = {}  # name -> start time of the run in progress
+        self.costs = {}    # name -> [wall ms, thread CPU ms], moving averages
+        self.backoff = 1
+        self.usage = {"cpu_percent": None, "load_per_core": None}
+        self.schedule = threading.Condition()
+        self.version = 0
+        self.changed = time.time()
+        self.subscribers = []
+
+    def start(self):
+        for name in self.probes:
+            threading.Thread(target=self._run, args=(name,), name=f"probe-{name}", daemon=True).start()
+        threading.Thread(target=self._govern, name="probe-governor", daemon=True).start()
+
+    def _run(self, name):
+        probe = self.probes[name]
+        while True:
+            started = self.running[name] = time.time()
+            cpu_started = time.thread_time()
+            failed = False
+            try:
+                result = probe.func()
+            except Exception as e:
+                print(f"Error collecting {name}: {e}")
+                failed = True
+            elapsed = time.time() - started
+            self._record_cost(name, elapsed, time.thread_time() - cpu_started)
+            stats.observe("probe", name, elapsed)
+            if failed:
+                stats.count("errors", name)
+            if not failed:
+                self._store(name, result)
+            del self.running[name]
+            with self.cond:
+                self.attempted.add(name)
+                self.cond.notify_all()
+            if elapsed > probe.timeout:
+                stats.count("timeouts", name)
+                print(f"Probe {name} took {elapsed:.1f}s (timeout {probe.timeout}s)")
+            # Re-checked whenever the backoff changes, so a probe sleeping
+            # through a stretched interval picks up a tightened one
+            with self.schedule:
+                while True:
+                    remaining = started + probe.interval * self.backoff - time.time()
+                    if remaining <= 0:
+                        break
+                    self.schedule.wait(remaining)
+
+    def _record_cost(self, name, wall, cpu):
+        sample = (wall * 1000, cpu * 1000)
+        cost = self.costs.get(name)
+        if cost is None:
+            self.costs[name] = list(sample)
+        else:
+            for i, value in enumerate(sample):
+                cost[i] += (value - cost[i]) * COST_SMOOTHING
+
+    def _govern(self):
+        # Doubles the interval stretch while the monitor's own CPU share or
+        # the host load is over budget, halves it once both are well under
+        cores = os.cpu_count() or 1
+        last_cpu, last_wall = time.process_time(), time.monotonic()
+        while True:
+            time.sleep(GOVERN_INTERVAL)
+            cpu, wall = time.process_time(), time.monotonic()
+            cpu_percent = (cpu - last_cpu) / (wall - last_wall) * 100
+            last_cpu, last_wall = cpu, wall
+            load = os.getloadavg()[0] / cores
+            self.usage = {"cpu_percent": round(cpu_percent, 2), "load_per_core": round(load, 2)}
+
+            backoff = self.backoff
+            if cpu_percent > CPU_BUDGET or load > LOAD_BUDGET:
+                backoff = min(backoff * 2, MAX_BACKOFF)
+            elif cpu_percent < CPU_BUDGET / 2 and load < LOAD_BUDGET / 2:
+                backoff = max(backoff // 2, 1)
+            if backoff != self.backoff:
+                print(f"Probe intervals x{backoff} (monitor CPU {cpu_percent:.1f}%, load/core {load:.2f})")
+                with self.schedule:
+                    self.backoff = backoff
+                    self.schedule.notify_all()
+
+    def subscribe(self, callback):
+        # callback(name, result) runs on the probe thread after each sample
+        self.subscribers.append(callback)
+
+    def _store(self, name, result):
+        with self.cond:
+            # Only bump the version when the data actually changed
+            if self.results.get(name) != result:
+                self.version += 1
+                self.changed = time.time()
+            self.results[name] = result
+            self.updated[name] = time.time()
+            self.cond.notify_all()
+        for callback in self.subscribers:
+            try:
+                callback(name, result)
+            except Exception as e:
+                stats.count("errors", f"{name} subscriber")
+                print(f"Error in {name} subscriber: {e}")
+
+    def get(self, name, timeout=10):
+        # Blocks only until the very first sample of a probe is in
+        with self.cond:
+            self.cond.wait_for(lambda: name in self.results, timeout)
+            return self.results.get(name)
+
+    def ready(self, timeout=None):
+        # Blocks until every probe has run once, or until the slowest
+        # probe's timeout has passed
+        if timeout is None:
+            timeout = max((p.timeout for p in self.probes.values()), default=0)
+        with self.cond:
+            return self.cond.wait_for(lambda: len(self.attempted) == len(self.probes), timeout)
+
+    def timed_out(self):
+        # Probes whose current run has gone past their timeout
+        now = time.time()
+        return sorted(name for name, started in list(self.running.items())
+                      if now - started > self.probes[name].timeout)
+
+    def scheduler_status(self):
+        return dict(self.usage, backoff=self.backoff, cpu_budget=CPU_BUDGET, load_budget=LOAD_BUDGET)
+
+    def health(self, results=None):
+        if results is None:
+            results = self.snapshot()[2]
+        return monitoring.compose_health(results, self.timed_out())
+
+    def wait_for_change(self, version, timeout):
+        # Blocks until the snapshot moves past `version` (or the timeout
+        # passes) and returns the current version
+        with self.cond:
+            self.cond.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def snapshot(self):
+        # Consistent (version, last change time, results) triple
+        with self.cond:
+            return self.version, self.changed, dict(self.results)
+
+    def age(self, name=None):
+        # Age of one probe's result, or of the oldest one
+        if name is None:
+            ages = [self.age(name) for name in self.probes]
+            return None if None in ages or not ages else max(ages)
+        updated = self.updated.get(name)
+        if updated is None:
+            return None
+        return time.time() - updated
+
+    def status(self):
+        status = {}
+        timed_out = self.timed_out()
+        for name, probe in self.probes.items():
+            age = self.age(name)
+            status[name] = {
+                "age": None if age is None else round(age, 1),
+                "interval": probe.interval,
+                "effective_interval": probe.interval * self.backoff,
+                "timeout": probe.timeout,
+                "cost": probe.cost,
+                "wall_ms": round(self.costs[name][0], 2) if name in self.costs else None,
+                "cpu_ms": round(self.costs[name][1], 2) if name in self.costs else None,
+                "stale": age is None or age > probe.interval * self.backoff * STALE_FACTOR,
+                "timed_out": name in timed_out
+            }
+        return status
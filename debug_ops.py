@@ -1,42 +1,27 @@
-
-import subprocess
-import socket
 import time
-import platform
 
-def check_network():
-    # Detect OS for correct ping timeout syntax
-    # Linux: -W 1 (1 second)
-    # macOS: -W 1000 (1000 milliseconds)
-    param = "-W"
-    system = platform.system().lower()
-    if system == "darwin":
-        timeout = "1000" 
-    else:
-        timeout = "1"
-    
-    print(f"OS Detection: {system}, checking with timeout {timeout}")
+import dnsprobe
+import reachability
 
-    # Reduced count and wait time for speed
+def check_network():
+    # In-process probe: ICMP datagram socket where permitted, TCP connect otherwise
     start = time.time()
-    res = subprocess.run(["ping", "-c", "1", param, timeout, "8.8.8.8"], stdout=subprocess.DEVNULL)
+    res = reachability.probe()
     end = time.time()
-    print(f"check_network: returncode={res.returncode}, time={end-start:.4f}s")
-    return res.returncode == 0
+    print(f"check_network: {res}, time={end-start:.4f}s")
+    return res["reachable"]
 
 def check_dns():
-    try:
-        socket.setdefaulttimeout(1)
-        start = time.time()
-        socket.gethostbyname("google.com")
-        end = time.time()
-        print(f"check_dns: Success, time={end-start:.4f}s")
-        return True
-    except Exception as e:
-        print(f"check_dns: Failed ({e})")
-        return False
+    # Queries every resolver in /etc/resolv.conf directly, in parallel
+    start = time.time()
+    res = dnsprobe.probe()
+    end = time.time()
+    for r in res["resolvers"]:
+        print(f"check_dns: {r['server']} {r['name']} ok={r['ok']} rcode={r['rcode']} ms={r['ms']} {r.get('error', '')}")
+    print(f"check_dns: time={end-start:.4f}s")
+    return res["ok"]
 
-print("Running checks with fix...")
+print("Running checks...")
 net = check_network()
 dns = check_dns()
 print(f"Network: {net}")
@@ -0,0 +1,98 @@
+import os
+import random
+import selectors
+import socket
+import struct
+import time
+
+RESOLV_CONF = "/etc/resolv.conf"
+
+# Names every resolver is asked for; any answer counts as resolved
+NAMES = [n.strip() for n in os.environ.get("DNS_NAMES", "google.com").split(",") if n.strip()]
+DNS_TIMEOUT = 1.0
+
+QTYPE_A = 1
+QCLASS_IN = 1
+
+RCODES = {0: "NOERROR", 1: "FORMERR", 2: "SERVFAIL", 3: "NXDOMAIN", 4: "NOTIMP", 5: "REFUSED"}
+
+def read_resolvers(path=RESOLV_CONF):
+    resolvers = []
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver":
+                    resolvers.append(parts[1].split("%", 1)[0])
+    except OSError:
+        pass
+    return resolvers
+
+def build_query(query_id, name, qtype=QTYPE_A):
+    # Header: id, flags (recursion desired), 1 question, no other records
+    header = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+    qname = b"".join(bytes([len(label)]) + label.encode("idna") for label in name.rstrip(".").split("."))
+    return header + qname + b"\0" + struct.pack("!HH", qtype, QCLASS_IN)
+
+def parse_response(data):
+    # -> (id, rcode, answer count)
+    query_id, flags, _, answers, _, _ = struct.unpack("!HHHHHH", data[:12])
+    return query_id, flags & 0x000F, answers
+
+def probe(resolvers=None, names=None, timeout=DNS_TIMEOUT, port=53):
+    # One non-blocking UDP socket per query, all multiplexed on a selector,
+    # so a stuck resolver only costs its own timeout. Each socket carries
+    # its own timeout; global socket defaults are never touched.
+    resolvers = resolvers if resolvers is not None else read_resolvers()
+    names = names or NAMES
+    sel = selectors.DefaultSelector()
+    results = []
+
+    for server in resolvers:
+        family = socket.AF_INET6 if ":" in server else socket.AF_INET
+        for name in names:
+            result = {"server": server, "name": name, "ok": False, "rcode": None, "ms": None}
+            results.append(result)
+            query_id = random.getrandbits(16)
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            try:
+                sock.connect((server, port))
+                sock.send(build_query(query_id, name))
+            except OSError as e:
+                result["error"] = str(e)
+                sock.close()
+                continue
+            sel.register(sock, selectors.EVENT_READ, (result, query_id, time.monotonic()))
+
+    deadline = time.monotonic() + timeout
+    while sel.get_map():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        for key, _ in sel.select(remaining):
+            result, query_id, started = key.data
+            try:
+                data = key.fileobj.recv(4096)
+                reply_id, rcode, answers = parse_response(data)
+            except (OSError, struct.error) as e:
+                # e.g. ECONNREFUSED from an ICMP port unreachable
+                result["error"] = str(e)
+            else:
+                if reply_id != query_id:
+                    continue
+                result["ms"] = round((time.monotonic() - started) * 1000, 2)
+                result["rcode"] = RCODES.get(rcode, str(rcode))
+                result["ok"] = rcode == 0 and answers > 0
+            sel.unregister(key.fileobj)
+            key.fileobj.close()
+
+    for key in list(sel.get_map().values()):
+        key.data[0]["error"] = "timeout"
+        key.fileobj.close()
+    sel.close()
+
+    return {
+        "ok": any(r["ok"] for r in results),
+        "resolvers": results
+    }
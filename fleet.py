@@ -0,0 +1,217 @@
+import gzip
+import http.client
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import wire
+from util import EMPTY_CONNECTIONS, EMPTY_SYSTEM
+
+# Socket timeout for each request to an agent (seconds)
+AGENT_TIMEOUT = float(os.environ.get("AGENT_TIMEOUT", 2))
+# Seconds between polls of each agent
+POLL_INTERVAL = 5
+
+_num = (int, float)
+_opt = (int, float, type(None))
+_str = (str, type(None))
+
+# What the node pages read from an agent's /health and /ports. Fields are
+# (accepted types, value used when missing or malformed), since an older
+# agent or one on another platform may leave some out; list rows are
+# {field: accepted types}, and rows that don't fit are dropped.
+HEALTH_SHAPE = {
+    "status": (str, "Unknown"),
+    "uptime": (str, "Unknown"),
+    "network": (bool, False),
+    "dns": (bool, False),
+    "ping": {"rtt_ms": (_opt, None), "loss": (_num, 1.0)},
+    "resolvers": [{"ok": bool, "ms": _opt}],
+    "processes": [{"pid": int, "name": str, "memory_mb": _num}],
+    "cpu_processes": [{"pid": int, "name": str, "cpu_percent": _num}],
+    "interfaces": [{"name": str, "rx_bps": _opt, "tx_bps": _opt}],
+    "connections": {
+        "established": (int, EMPTY_CONNECTIONS["established"]),
+        "by_port": [{"port": int, "connections": int}],
+    },
+    "system": {
+        "cpu_percent": (_opt, None),
+        "cores": [_opt],
+        "load": ((list, type(None)), None),
+        "memory": ((dict, type(None)), None),
+        "disks": [{"name": str, "read_bps": _opt, "write_bps": _opt, "util_percent": _opt}],
+        "temperature": (_opt, EMPTY_SYSTEM["temperature"]),
+    },
+}
+PORT_SHAPE = [{"protocol": str, "ip": str, "port": int, "scope": str, "pid": (int, type(None)), "process": _str}]
+
+def _fits(value, shape):
+    if isinstance(shape, dict):
+        return isinstance(value, dict) and all(_fits(value.get(k), t) for k, t in shape.items())
+    return isinstance(value, shape)
+
+def _conform(value, shape):
+    if isinstance(shape, tuple):
+        types, default = shape
+        return value if isinstance(value, types) else default
+    if isinstance(shape, list):
+        row = shape[0]
+        if not isinstance(value, list):
+            return []
+        if not isinstance(row, dict):
+            return [v for v in value if _fits(v, row)]
+        return [{**v, **{k: v.get(k) for k in row}} for v in value if _fits(v, row)]
+    value = value if isinstance(value, dict) else {}
+    return {**value, **{k: _conform(value.get(k), s) for k, s in shape.items()}}
+
+def conform(health, ports):
+    # -> (health, ports) safe to render, or ValueError when they aren't
+    # even the right kind of document
+    if not isinstance(health, dict) or not isinstance(ports, list):
+        raise ValueError("unexpected /health or /ports document")
+    return _conform(health, HEALTH_SHAPE), _conform(ports, PORT_SHAPE)
+
+
+class Agent:
+    # One remote html-dashboard.py. The last good /health and /ports are
+    # kept, so a node that stops answering still shows its last state.
+    def __init__(self, address, timeout=AGENT_TIMEOUT):
+        url = urlsplit(address if "//" in address else "http://" + address)
+        self.name = url.netloc
+        self.host = url.hostname
+        self.port = url.port or 8080
+        self.timeout = timeout
+        self.conn = None
+        self.etags = {}
+        self.health = None
+        self.ports = None
+        self.updated = None     # time of the last good poll
+        self.error = None       # why the last poll failed, if it did
+        self.latency_ms = None
+        self.version = 0
+
+    def _get(self, path, cached):
+        # Keep-alive connection reused across polls. The agent closes idle
+        # connections, so a request that fails on a reused connection is
+        # retried once on a fresh one; timeouts are not retried.
+        for attempt in range(2):
+            fresh = self.conn is None
+            if fresh:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            # Binary and gzipped: a fraction of the JSON size over slow links
+            headers = {"Accept": wire.CONTENT_TYPE, "Accept-Encoding": "gzip"}
+            if path in self.etags and cached is not None:
+                headers["If-None-Match"] = self.etags[path]
+            try:
+                self.conn.request("GET", path, headers=headers)
+                response = self.conn.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                self.conn.close()
+                self.conn = None
+                if fresh or isinstance(e, TimeoutError):
+                    raise
+                continue
+            if response.status == 304:
+                return cached
+            if response.status != 200:
+                raise http.client.HTTPException(f"{path} returned HTTP {response.status}")
+            if response.getheader("ETag"):
+                self.etags[path] = response.getheader("ETag")
+            if response.getheader("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            if response.getheader("Content-Type", "").startswith(wire.CONTENT_TYPE):
+                return wire.unpack(body)
+            return json.loads(body)
+
+    def poll(self):
+        # -> True when the data or the error changed
+        started = time.monotonic()
+        try:
+            health = self._get("/health", self.health)
+            ports = self._get("/ports", self.ports)
+            if health is not self.health or ports is not self.ports:
+                health, ports = conform(health, ports)
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            error = str(e) or type(e).__name__
+            changed = error != self.error
+            self.error = error
+            return changed
+        self.latency_ms = round((time.monotonic() - started) * 1000, 1)
+        # Probe ages and costs in /health move on every poll; only count
+        # what the pages show as a change
+        changed = self.error is not None or self.ports != ports or \
+            {k: v for k, v in health.items() if k not in ("probes", "scheduler")} != \
+            {k: v for k, v in (self.health or {}).items() if k not in ("probes", "scheduler")}
+        self.health, self.ports = health, ports
+        self.updated = time.time()
+        self.error = None
+        return changed
+
+    def summary(self):
+        health = self.health or {}
+        system = health.get("system") or {}
+        return {
+            "name": self.name,
+            "ok": self.error is None and self.updated is not None,
+            "error": self.error,
+            "age": None if self.updated is None else round(time.time() - self.updated, 1),
+            "latency_ms": self.latency_ms,
+            "status": health.get("status"),
+            "uptime": health.get("uptime"),
+            "cpu_percent": system.get("cpu_percent"),
+            "load": (system.get("load") or [None])[0],
+            "memory_percent": (system.get("memory") or {}).get("used_percent"),
+            "temperature": system.get("temperature"),
+            "listeners": None if self.ports is None else len(self.ports)
+        }
+
+
+class Fleet:
+    # Every agent is polled on its own thread, so a round across N nodes
+    # takes as long as the slowest one rather than the sum of all of them
+    def __init__(self, addresses, interval=POLL_INTERVAL, timeout=AGENT_TIMEOUT):
+        self.agents = {}
+        for address in addresses:
+            agent = Agent(address, timeout)
+            self.agents[agent.name] = agent
+        self.interval = interval
+        self.cond = threading.Condition()
+        self.version = 0
+        self.changed = time.time()
+
+    def start(self):
+        for agent in self.agents.values():
+            threading.Thread(target=self._run, args=(agent,), name=f"agent-{agent.name}", daemon=True).start()
+
+    def _run(self, agent):
+        while True:
+            started = time.time()
+            changed = agent.poll()
+            with self.cond:
+                if changed:
+                    agent.version += 1
+                    self.version += 1
+                    self.changed = time.time()
+                self.cond.notify_all()
+            time.sleep(max(0, self.interval - (time.time() - started)))
+
+    def wait_for_change(self, version, timeout):
+        with self.cond:
+            self.cond.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def summary(self):
+        # -> (version, last change time, per-node summaries)
+        with self.cond:
+            return self.version, self.changed, [agent.summary() for agent in self.agents.values()]
+
+    def node(self, name):
+        # -> (version, health, ports) of the last good poll, or None
+        with self.cond:
+            agent = self.agents.get(name)
+            if agent is None or agent.health is None:
+                return None
+            return agent.version, agent.health, agent.ports or []
@@ -0,0 +1,219 @@
+import math
+import threading
+import time
+from array import array
+from collections import deque
+
+# Tier name -> (seconds per slot, slots kept). Timestamps are implicit in
+# the slot position, so each slot costs one float32: a week of raw 5s
+# samples is ~470KB per metric and all three tiers ~780KB.
+TIERS = (
+    ("raw", 5, 7 * 24 * 720),
+    ("1m", 60, 30 * 24 * 60),
+    ("15m", 900, 365 * 96),
+)
+
+# Most points a /history response returns before a coarser tier is used
+MAX_POINTS = 1500
+
+# Boot time (sample time - uptime) has to move forward by more than this
+# (seconds) across a monitor restart to count as a reboot; covers clock
+# jitter and the float32 rounding of stored uptimes
+REBOOT_SLACK = 60
+# A gap this long (seconds) between stored uptime samples means the
+# monitor was down in between
+REBOOT_GAP = 60
+
+NAN = float("nan")
+
+
+class Ring:
+    # Fixed-size float32 ring indexed by time slot (timestamp // step).
+    # Slots that were never written hold NaN.
+    def __init__(self, step, capacity):
+        self.step = step
+        self.capacity = capacity
+        self.values = array("f", [NAN]) * capacity
+        self.last = None  # newest slot written
+
+    def put(self, slot, value):
+        if self.last is not None:
+            if slot <= self.last - self.capacity:
+                return
+            # Clear the slots skipped over since the last write
+            for gap in range(self.last + 1, min(slot, self.last + self.capacity + 1)):
+                self.values[gap % self.capacity] = NAN
+        self.values[slot % self.capacity] = value
+        if self.last is None or slot > self.last:
+            self.last = slot
+
+    def query(self, start, end):
+        if self.last is None:
+            return []
+        first = max(int(start // self.step), self.last - self.capacity + 1)
+        last = min(int(end // self.step), self.last)
+        points = []
+        for slot in range(first, last + 1):
+            value = self.values[slot % self.capacity]
+            if not math.isnan(value):
+                points.append([slot * self.step, round(value, 3)])
+        return points
+
+
+class Metric:
+    def __init__(self):
+        self.rings = [(name, Ring(step, capacity)) for name, step, capacity in TIERS]
+        # Running (slot, sum, count) average for each downsampled tier
+        self.pending = [None] * len(TIERS)
+
+    def add(self, ts, value, count=None):
+        # With a count, value is the average of that many samples and only
+        # goes into the downsampled tiers
+        for i, (name, ring) in enumerate(self.rings):
+            slot = int(ts // ring.step)
+            if i == 0:
+                if count is None:
+                    ring.put(slot, value)
+                continue
+            acc = self.pending[i]
+            if acc is None or acc[0] != slot:
+                acc = self.pending[i] = [slot, 0.0, 0]
+            acc[1] += value * (count or 1)
+            acc[2] += count or 1
+            # The slot holds the running average until it closes
+            ring.put(slot, acc[1] / acc[2])
+
+
+class History:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.reboots = deque(maxlen=100)
+        self.last_uptime = None
+        self.last_uptime_ts = None
+        self.boot_time = None
+        self.live = False   # an uptime sample has come in from this run
+        self.store = None
+
+    def attach_store(self, store):
+        # Replay what is on disk into the rings in one pass over the
+        # segments, then persist new samples. Samples are folded into
+        # per-minute averages on the way: once the store is attached the raw
+        # tier is read straight off disk, the coarser tiers only need those.
+        # Stored uptimes also bring back the reboots of earlier runs and the
+        # boot time the first live sample is compared with.
+        now = time.time()
+        step = TIERS[1][1]
+        names = store.names()
+        uptime_id = next((i for i, name in names.items() if name == "uptime_seconds"), None)
+        minutes = {}  # metric id -> [minute, sum, count] being folded
+        span = max(step * capacity for name, step, capacity in TIERS)
+        for ts, metric_id, value in store.scan(now - span, now):
+            if metric_id == uptime_id:
+                resumed = self.last_uptime_ts is None or ts - self.last_uptime_ts > REBOOT_GAP
+                self._check_reboot(value, ts, resumed)
+            minute = ts // step
+            acc = minutes.get(metric_id)
+            if acc is not None and acc[0] == minute:
+                acc[1] += value
+                acc[2] += 1
+                continue
+            if acc is not None:
+                with self.lock:
+                    self._metric(names[metric_id]).add(acc[0] * step, acc[1] / acc[2], acc[2])
+            minutes[metric_id] = [minute, value, 1]
+        with self.lock:
+            for metric_id, (minute, total, count) in minutes.items():
+                self._metric(names[metric_id]).add(minute * step, total / count, count)
+        self.store = store
+
+    def _metric(self, name):
+        # Caller holds the lock
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = Metric()
+        return metric
+
+    def add(self, name, value, ts=None):
+        if value is None:
+            return
+        ts = ts if ts is not None else time.time()
+        with self.lock:
+            self._metric(name).add(ts, float(value))
+        if self.store is not None:
+            self.store.append(name, float(value), ts)
+
+    def record(self, probe, result, ts=None):
+        # Collector callback: turn a probe result into samples
+        ts = ts if ts is not None else time.time()
+        if probe == "processes":
+            self.add("top_process_mb", sum(p["memory_mb"] for p in result), ts)
+        elif probe == "ping":
+            self.add("ping_rtt_ms", result["rtt_ms"], ts)
+            self.add("ping_loss", result["loss"], ts)
+        elif probe == "resolvers":
+            dns_times = [r["ms"] for r in result if r["ok"]]
+            self.add("dns_ms", min(dns_times) if dns_times else None, ts)
+        elif probe == "system":
+            self.add("cpu_percent", result["cpu_percent"], ts)
+            self.add("load1", result["load"][0] if result["load"] else None, ts)
+            self.add("memory_used_percent", result["memory"]["used_percent"] if result["memory"] else None, ts)
+            self.add("temperature", result["temperature"], ts)
+        elif probe == "uptime_seconds":
+            self.add("uptime_seconds", result, ts)
+            self._check_reboot(result, ts, resumed=not self.live)
+            self.live = True
+        elif probe == "ports":
+            self.add("listeners", len(result), ts)
+
+    def _check_reboot(self, uptime, ts, resumed):
+        # The monitor restarts with the host, so comparing with the previous
+        # sample of this run alone never sees a reboot. Uptime going
+        # backwards, or a later boot time on the first sample after the
+        # monitor was down, means the host restarted in between. Boot times
+        # are only compared across restarts: within a run a clock step
+        # (NTP on a Pi without an RTC) moves them too.
+        if uptime is None:
+            return
+        boot = ts - uptime
+        if self.last_uptime is not None and \
+                (uptime < self.last_uptime or resumed and boot > self.boot_time + REBOOT_SLACK):
+            self.reboots.append(int(boot))
+        self.last_uptime, self.last_uptime_ts, self.boot_time = uptime, ts, boot
+
+    def query(self, name, seconds, now=None):
+        now = now if now is not None else time.time()
+        start = now - seconds
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                return None
+            # Finest tier that covers the range without too many points
+            for tier, ring in metric.rings:
+                if seconds <= ring.step * ring.capacity and seconds / ring.step <= MAX_POINTS:
+                    break
+            if tier == "raw" and self.store is not None:
+                # Raw samples come straight off the mmap'd segments
+                points = None
+            else:
+                points = ring.query(start, now)
+        if points is None:
+            points = self.store.query(name, start, now)
+        return {
+            "metric": name,
+            "tier": tier,
+            "step": ring.step,
+            "points": points
+        }
+
+
+def parse_range(value):
+    # "90s", "15m", "6h", "7d" -> seconds
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+    if value and value[-1] in units:
+        seconds = float(value[:-1]) * units[value[-1]]
+    else:
+        seconds = float(value)
+    if not math.isfinite(seconds):
+        raise ValueError(f"range out of bounds: {value}")
+    return int(seconds)
@@ -1,67 +1,103 @@
 from http.server import BaseHTTPRequestHandler, HTTPServer
+from email.utils import formatdate
+from queue import Queue
+from urllib.parse import parse_qs, unquote, urlsplit
+import argparse
+import gzip
+import html
 import json
-import monitoring
+import math
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from collector import Collector
+from fleet import Fleet
+from history import History, parse_range
+from store import Store
+import metrics
+import profiler
+from portwatch import PortWatch
+import stats
+import wire
 
-# --- HTML TEMPLATE ---
+# Shared snapshot, refreshed in the background; handlers never probe directly
+collector = Collector()
+history = History()
+collector.subscribe(history.record)
+port_watch = PortWatch()
+collector.subscribe(port_watch.record)
+# Aggregator mode (--agents): polls other dashboards for the /fleet pages
+fleet = None
+# --self-metrics: append the monitor's own histograms and counters to /metrics
+SELF_METRICS = False
+# --profiling: allow /debug/profile
+PROFILING = os.environ.get("PROFILING") == "1"
 
-def render_html(health, ports):
-    # Grafana-inspired variables
-    # Dark Theme
-    bg_color = "#101217"       # Very dark, almost black
-    panel_bg = "#181b1f"       # Slightly lighter for cards
-    header_on_panel = "#22252b" # Header background for panels
-    text_main = "#dce4e9"      # Off-white
-    text_muted = "#9fa7b3"     # Muted text
-    border_color = "#2c3235"   # Subtle borders
-    
-    # Grafana Brand Colors
-    orange = "#FF9900"
-    blue = "#5794F2"
-    green = "#73BF69"
-    red = "#F2495C"
-    purple = "#B877D9"
-    
-    # Logic
-    is_online = health['status'] == "Online"
-    if is_online:
-        status_color = green
-        status_icon = "check" # Using simple CSS shapes/text instead of complex SVGs for simplicity unless inline
-    elif health['status'] == "DNS Error":
-        status_color = orange
-    else:
-        status_color = red
+# Routes timed under their own name; anything else is grouped
+ROUTES = {"/", "/ports", "/health", "/metrics", "/ports/changes", "/history", "/debug/stats",
+          "/debug/profile", "/fleet", "/fleet/nodes"}
 
-    # Process Rows
-    proc_rows = ""
-    for p in health['processes']:
-        proc_rows += f"""
-        <div class="table-row">
-            <div class="col mono" style="color: {orange};">{p['pid']}</div>
-            <div class="col" style="font-weight: 500; color: {text_main};">{p['name']}</div>
-            <div class="col right" style="color: {blue};">{p['memory_mb']} MB</div>
-            <div class="col right graph-col">
-                <div class="bar-bg"><div class="bar-fill" style="width: {min(p['memory_mb']/10, 100)}%; background-color: {blue};"></div></div>
-            </div>
-        </div>"""
+# Snapshot and fleet versions count from 0 in every process; ETags carry
+# this run's start time too, so a tag from before a restart never matches
+RUN_ID = f"{time.time_ns() // 1000000:x}"
 
-    # Port Rows
-    port_rows = ""
-    for p in ports:
-        badge_style = f"background: rgba(50, 116, 217, 0.15); color: {blue}; border: 1px solid rgba(50, 116, 217, 0.3);"
-        if p['protocol'] == 'udp':
-            badge_style = f"background: rgba(184, 119, 217, 0.15); color: {purple}; border: 1px solid rgba(184, 119, 217, 0.3);"
-            
-        scope_color = green if p['scope'] == 'Public' else text_muted
-        
-        port_rows += f"""
-        <div class="table-row">
-            <div class="col"><span class="badge" style="{badge_style}">{p['protocol'].upper()}</span></div>
-            <div class="col mono" style="color: {orange};">{p['port']}</div>
-            <div class="col mono" style="color: {text_main};">{p['ip']}</div>
-            <div class="col" style="color: {scope_color};">{p['scope']}</div>
-        </div>"""
+# (route, representation, gzipped) -> (version, body, content encoding).
+# Each response is serialised (and compressed) once per data version.
+_encoded = {}
+# Responses smaller than this aren't worth compressing
+GZIP_MIN_BYTES = 512
+
+# API representations: ?format=msgpack or "Accept: application/msgpack"
+# for binary, ?pretty=1 for indented JSON, compact JSON otherwise
+FORMATS = {
+    "json": ("application/json", lambda data: json.dumps(data, separators=(",", ":")).encode()),
+    "pretty": ("application/json", lambda data: json.dumps(data, indent=2).encode()),
+    "msgpack": (wire.CONTENT_TYPE, wire.pack),
+}
+# (snapshot version, fragments) shared by the page and every /events client
+_fragments_cache = (None, {})
+
+# Seconds between keep-alive comments on an idle event stream
+EVENTS_KEEPALIVE = 15
+# Event streams get a thread each, outside the worker pool; only this many
+# may be open at once
+_streams = threading.BoundedSemaphore(12)
+
+def current_fragments():
+    # -> (version, fragments), rendered at most once per snapshot version
+    global _fragments_cache
+    version, changed, results = collector.snapshot()
+    if not results:
+        return version, None
+    if _fragments_cache[0] != version:
+        with stats.timer("render", "fragments"):
+            _fragments_cache = (version, render_fragments(collector.health(results), results.get("ports", [])))
+    return _fragments_cache
 
-    html = f"""
+# --- HTML TEMPLATE ---
+
+# Grafana-inspired variables
+# Dark Theme
+bg_color = "#101217"       # Very dark, almost black
+panel_bg = "#181b1f"       # Slightly lighter for cards
+header_on_panel = "#22252b" # Header background for panels
+text_main = "#dce4e9"      # Off-white
+text_muted = "#9fa7b3"     # Muted text
+border_color = "#2c3235"   # Subtle borders
+
+# Grafana Brand Colors
+orange = "#FF9900"
+blue = "#5794F2"
+green = "#73BF69"
+red = "#F2495C"
+purple = "#B877D9"
+
+# The page shell never changes, so it is built once at import; only the
+# body is rendered per snapshot
+_PAGE_HEAD = f"""
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -211,31 +247,275 @@ def render_html(health, ports):
             .panel-uptime {{ grid-column: span 4; }}
             .panel-health {{ grid-column: span 4; }}
             .panel-memory {{ grid-column: span 6; }}
-            .panel-ports  {{ grid-column: span 6; }}
+            .panel-cpu    {{ grid-column: span 6; }}
+            .panel-system {{ grid-column: span 12; }}
+            .panel-traffic {{ grid-column: span 6; }}
+            .panel-connections {{ grid-column: span 6; }}
+            .panel-ports  {{ grid-column: span 12; }}
             
             @media (max-width: 900px) {{
                 .panel-status, .panel-uptime, .panel-health {{ grid-column: span 12; }}
-                .panel-memory, .panel-ports {{ grid-column: span 12; }}
+                .panel-memory, .panel-cpu, .panel-ports {{ grid-column: span 12; }}
+                .panel-system, .panel-traffic, .panel-connections {{ grid-column: span 12; }}
             }}
         </style>
     </head>
-    <body>
-        <div class="navbar">
-            <div style="width: 24px; height: 24px; background: #FF9900; mask-image: url('https://upload.wikimedia.org/wikipedia/commons/3/3b/Grafana_icon.svg'); -webkit-mask-image: url('https://upload.wikimedia.org/wikipedia/commons/3/3b/Grafana_icon.svg'); -webkit-mask-size: contain; mask-size: contain;"></div>
-            <h1>Pi5 Monitoring</h1>
-            
-            <!-- Refresh Control -->
+"""
+
+_PAGE_TAIL = f"""
+        <script>
+            const select = document.getElementById("refreshInterval");
+            let timer = null;
+            let source = null;
+
+            // Load saved preference
+            const saved = localStorage.getItem("refresh_interval");
+            if (saved !== null) {{
+                select.value = saved;
+            }} else {{
+                select.value = "live"; // Default
+            }}
+
+            // Live mode: the server pushes only the fragments that changed
+            function startLive() {{
+                source = new EventSource(document.body.dataset.events);
+                source.onmessage = (event) => {{
+                    const changed = JSON.parse(event.data);
+                    for (const id in changed) {{
+                        const el = document.getElementById(id);
+                        if (el) el.innerHTML = changed[id];
+                    }}
+                }};
+                source.onerror = () => {{
+                    // Refused outright (e.g. too many streams): fall back to reloading
+                    if (source.readyState === EventSource.CLOSED) {{
+                        source = null;
+                        timer = setTimeout(() => window.location.reload(), 30000);
+                    }}
+                }};
+            }}
+
+            function updateRefresh() {{
+                const val = select.value;
+                localStorage.setItem("refresh_interval", val);
+                
+                if (timer) clearTimeout(timer);
+                if (source) {{
+                    source.close();
+                    source = null;
+                }}
+                
+                if (val === "live") {{
+                    startLive();
+                }} else if (val !== "0") {{
+                    const ms = parseInt(val) * 1000;
+                    timer = setTimeout(() => window.location.reload(), ms);
+                    console.log("Refreshing in " + ms + "ms");
+                }}
+            }}
+
+            // Init
+            updateRefresh();
+        </script>
+    </body>
+    </html>
+"""
+
+_REFRESH_SELECT = """<!-- Refresh Control -->
             <select id="refreshInterval" class="refresh-select" onchange="updateRefresh()">
+                <option value="live">Live</option>
                 <option value="5">5s</option>
                 <option value="10">10s</option>
                 <option value="30">30s</option>
                 <option value="60">60s</option>
                 <option value="0">Off</option>
-            </select>
+            </select>"""
+
+def format_rate(value):
+    if value is None: return "-"
+    for unit in ("B/s", "KB/s", "MB/s"):
+        if value < 1024: return f"{value:.0f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB/s"
+
+def escape_all(value):
+    # Process names, interface names, and everything a fleet agent sends
+    # are not ours to trust: escape every string before it goes into markup
+    if isinstance(value, str):
+        return html.escape(value)
+    if isinstance(value, dict):
+        return {k: escape_all(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [escape_all(v) for v in value]
+    return value
+
+def render_fragments(health, ports):
+    # Every part of the page that changes with the data, keyed by the id of
+    # the element it fills; /events pushes just the ones that changed
+    health, ports = escape_all(health), escape_all(ports)
+    # Logic
+    is_online = health['status'] == "Online"
+    if is_online:
+        status_color = green
+        status_icon = "check" # Using simple CSS shapes/text instead of complex SVGs for simplicity unless inline
+    elif health['status'] == "DNS Error":
+        status_color = orange
+    else:
+        status_color = red
+
+    # Fastest answering resolver
+    dns_times = [r['ms'] for r in health['resolvers'] if r['ok']]
+    dns_ms = min(dns_times) if dns_times else None
+
+    # Process Rows
+    proc_rows = []
+    for p in health['processes']:
+        proc_rows.append(f"""
+        <div class="table-row">
+            <div class="col mono" style="color: {orange};">{p['pid']}</div>
+            <div class="col" style="font-weight: 500; color: {text_main};">{p['name']}</div>
+            <div class="col right" style="color: {blue};">{p['memory_mb']} MB</div>
+            <div class="col right graph-col">
+                <div class="bar-bg"><div class="bar-fill" style="width: {min(p['memory_mb']/10, 100)}%; background-color: {blue};"></div></div>
+            </div>
+        </div>""")
+
+    # CPU Rows
+    cpu_rows = []
+    for p in health['cpu_processes']:
+        cpu_rows.append(f"""
+        <div class="table-row">
+            <div class="col mono" style="color: {orange};">{p['pid']}</div>
+            <div class="col" style="font-weight: 500; color: {text_main};">{p['name']}</div>
+            <div class="col right" style="color: {purple};">{p['cpu_percent']}%</div>
+            <div class="col right graph-col">
+                <div class="bar-bg"><div class="bar-fill" style="width: {min(p['cpu_percent'], 100)}%; background-color: {purple};"></div></div>
+            </div>
+        </div>""")
+
+    # Port Rows
+    port_rows = []
+    for p in ports:
+        badge_style = f"background: rgba(50, 116, 217, 0.15); color: {blue}; border: 1px solid rgba(50, 116, 217, 0.3);"
+        if p['protocol'] == 'udp':
+            badge_style = f"background: rgba(184, 119, 217, 0.15); color: {purple}; border: 1px solid rgba(184, 119, 217, 0.3);"
             
-            <div style="margin-left: auto; color: var(--muted); font-size: 12px; display: flex; align-items: center; gap: 8px;">
+        scope_color = green if p['scope'] == 'Public' else text_muted
+        
+        port_rows.append(f"""
+        <div class="table-row">
+            <div class="col"><span class="badge" style="{badge_style}">{p['protocol'].upper()}</span></div>
+            <div class="col mono" style="color: {orange};">{p['port']}</div>
+            <div class="col mono" style="color: {text_main};">{p['ip']}</div>
+            <div class="col" style="color: {scope_color};">{p['scope']}</div>
+            <div class="col" style="color: {text_muted};" title="PID {p['pid'] or '?'}">{p['process'] or '-'}</div>
+        </div>""")
+
+    # Interface Rows
+    traffic_rows = []
+    for i in health['interfaces']:
+        traffic_rows.append(f"""
+        <div class="table-row">
+            <div class="col mono" style="color: {orange};">{i['name']}</div>
+            <div class="col right" style="color: {green};">{format_rate(i['rx_bps'])}</div>
+            <div class="col right" style="color: {blue};">{format_rate(i['tx_bps'])}</div>
+        </div>""")
+
+    # Connection Rows: established connections per listening port
+    conn = health['connections']
+    conn_rows = [f"""
+        <div class="table-row">
+            <div class="col" style="color: {text_muted};">Established</div>
+            <div class="col right" style="color: {text_main};">{conn['established']}</div>
+        </div>"""]
+    for c in conn['by_port']:
+        conn_rows.append(f"""
+        <div class="table-row">
+            <div class="col mono" style="color: {orange};">:{c['port']}</div>
+            <div class="col right" style="color: {blue};">{c['connections']}</div>
+        </div>""")
+
+    # System: headline numbers, then per-core and disk rows
+    system = health['system']
+    memory = system['memory'] or {}
+    load = system['load'] or [None]
+    temp = system['temperature']
+    temp_color = red if temp is not None and temp >= 80 else orange if temp is not None and temp >= 70 else text_main
+    def stat(value, label, color=text_main):
+        return f"""
+                        <div>
+                            <div class="stat-value" style="font-size: 24px; color: {color};">{value}</div>
+                            <div class="stat-label">{label}</div>
+                        </div>"""
+    system_stats = "".join([
+        stat("-" if system['cpu_percent'] is None else f"{system['cpu_percent']}%", "CPU", purple),
+        stat("-" if load[0] is None else load[0], "Load (1m)"),
+        stat("-" if memory.get('used_percent') is None else f"{memory['used_percent']}%",
+             f"Memory · {memory.get('available_mb', '-')} MB free", blue),
+        stat("-" if temp is None else f"{temp}°C", "SoC Temp", temp_color),
+    ])
+    system_rows = []
+    for n, cpu in enumerate(system['cores']):
+        system_rows.append(f"""
+        <div class="table-row">
+            <div class="col mono" style="color: {orange};">cpu{n}</div>
+            <div class="col right" style="color: {purple};">{'-' if cpu is None else f'{cpu}%'}</div>
+            <div class="col right graph-col">
+                <div class="bar-bg"><div class="bar-fill" style="width: {min(cpu or 0, 100)}%; background-color: {purple};"></div></div>
+            </div>
+        </div>""")
+    for d in system['disks']:
+        system_rows.append(f"""
+        <div class="table-row">
+            <div class="col mono" style="color: {orange};">{d['name']}</div>
+            <div class="col right" style="color: {green};">R {format_rate(d['read_bps'])}</div>
+            <div class="col right" style="color: {blue};">W {format_rate(d['write_bps'])}</div>
+            <div class="col right" style="color: {text_muted};">{d['util_percent']}% busy</div>
+        </div>""")
+
+    return {
+        "nav-status": f"""
                 <span style="width: 8px; height: 8px; background: {status_color}; border-radius: 50%; display: inline-block;"></span>
-                {health['status']}
+                {health['status']}""",
+        "status": f"""
+                    <div style="font-size: 24px; color: {status_color}; font-weight: 600; margin-bottom: 5px;">
+                        {health['status']}
+                    </div>""",
+        "uptime": health['uptime'],
+        "connectivity": f"""
+                        <div>
+                            <div style="font-size: 18px; color: {'#73BF69' if health['network'] else '#F2495C'}">
+                                {"Connected" if health['network'] else "Disconnected"}
+                            </div>
+                            <div class="stat-label">Network{f" · {health['ping']['rtt_ms']} ms, {int(health['ping']['loss'] * 100)}% loss" if health['ping']['rtt_ms'] is not None else ""}</div>
+                        </div>
+                        <div>
+                            <div style="font-size: 18px; color: {'#73BF69' if health['dns'] else '#F2495C'}">
+                                {"Resolved" if health['dns'] else "Failed"}
+                            </div>
+                            <div class="stat-label">DNS{f" · {dns_ms} ms" if dns_ms is not None else ""}</div>
+                        </div>""",
+        "proc-rows": "".join(proc_rows),
+        "cpu-rows": "".join(cpu_rows),
+        "port-rows": "".join(port_rows),
+        "traffic-rows": "".join(traffic_rows),
+        "conn-rows": "".join(conn_rows),
+        "system-stats": system_stats,
+        "system-rows": "".join(system_rows),
+    }
+
+def render_html(health, ports, fragments=None, title="Pi5 Monitoring", events="/events"):
+    # `events` is the stream the page follows in Live mode
+    f = fragments or render_fragments(health, ports)
+    body = f"""
+    <body data-events="{events}">
+        <div class="navbar">
+            <div style="width: 24px; height: 24px; background: #FF9900; mask-image: url('https://upload.wikimedia.org/wikipedia/commons/3/3b/Grafana_icon.svg'); -webkit-mask-image: url('https://upload.wikimedia.org/wikipedia/commons/3/3b/Grafana_icon.svg'); -webkit-mask-size: contain; mask-size: contain;"></div>
+            <h1>{title}</h1>
+            
+            {_REFRESH_SELECT}
+            
+            <div id="nav-status" style="margin-left: auto; color: var(--muted); font-size: 12px; display: flex; align-items: center; gap: 8px;">{f['nav-status']}
             </div>
         </div>
 
@@ -244,8 +524,7 @@ def render_html(health, ports):
             <div class="panel panel-status">
                 <div class="panel-header">System Status</div>
                 <div class="panel-content" style="display: flex; align-items: center; justify-content: center; flex-direction: column;">
-                    <div style="font-size: 24px; color: {status_color}; font-weight: 600; margin-bottom: 5px;">
-                        {health['status']}
+                    <div id="status">{f['status']}
                     </div>
                      <div class="stat-label">Overall Health</div>
                 </div>
@@ -255,7 +534,7 @@ def render_html(health, ports):
             <div class="panel panel-uptime">
                 <div class="panel-header">Uptime</div>
                 <div class="panel-content">
-                    <div class="stat-value" style="color: var(--green);">{health['uptime']}</div>
+                    <div class="stat-value" id="uptime" style="color: var(--green);">{f['uptime']}</div>
                     <div class="stat-label">Since last boot</div>
                 </div>
             </div>
@@ -264,19 +543,7 @@ def render_html(health, ports):
             <div class="panel panel-health">
                 <div class="panel-header">Connectivity</div>
                 <div class="panel-content">
-                     <div style="display: flex; gap: 20px;">
-                        <div>
-                            <div style="font-size: 18px; color: {'#73BF69' if health['network'] else '#F2495C'}">
-                                {"Connected" if health['network'] else "Disconnected"}
-                            </div>
-                            <div class="stat-label">Network</div>
-                        </div>
-                        <div>
-                            <div style="font-size: 18px; color: {'#73BF69' if health['dns'] else '#F2495C'}">
-                                {"Resolved" if health['dns'] else "Failed"}
-                            </div>
-                            <div class="stat-label">DNS</div>
-                        </div>
+                     <div id="connectivity" style="display: flex; gap: 20px;">{f['connectivity']}
                      </div>
                 </div>
             </div>
@@ -291,8 +558,66 @@ def render_html(health, ports):
                         <div class="col right">Mem (MB)</div>
                         <div class="col right graph-col"></div>
                     </div>
-                    <div class="scroll-list">
-                        {proc_rows}
+                    <div class="scroll-list" id="proc-rows">
+                        {f['proc-rows']}
+                    </div>
+                </div>
+            </div>
+
+            <!-- Panel: CPU -->
+            <div class="panel panel-cpu">
+                <div class="panel-header">Top CPU Processes</div>
+                <div class="panel-content">
+                    <div class="table-row table-header">
+                        <div class="col mono">PID</div>
+                        <div class="col">Process</div>
+                        <div class="col right">CPU</div>
+                        <div class="col right graph-col"></div>
+                    </div>
+                    <div class="scroll-list" id="cpu-rows">
+                        {f['cpu-rows']}
+                    </div>
+                </div>
+            </div>
+
+            <!-- Panel: System -->
+            <div class="panel panel-system">
+                <div class="panel-header">System</div>
+                <div class="panel-content">
+                    <div id="system-stats" style="display: flex; justify-content: space-around; margin-bottom: 12px;">
+                        {f['system-stats']}
+                    </div>
+                    <div class="scroll-list" id="system-rows">
+                        {f['system-rows']}
+                    </div>
+                </div>
+            </div>
+
+            <!-- Panel: Traffic -->
+            <div class="panel panel-traffic">
+                <div class="panel-header">Network Traffic</div>
+                <div class="panel-content">
+                    <div class="table-row table-header">
+                        <div class="col">Interface</div>
+                        <div class="col right">RX</div>
+                        <div class="col right">TX</div>
+                    </div>
+                    <div class="scroll-list" id="traffic-rows">
+                        {f['traffic-rows']}
+                    </div>
+                </div>
+            </div>
+
+            <!-- Panel: Connections -->
+            <div class="panel panel-connections">
+                <div class="panel-header">TCP Connections</div>
+                <div class="panel-content">
+                    <div class="table-row table-header">
+                        <div class="col">Local Port</div>
+                        <div class="col right">Connections</div>
+                    </div>
+                    <div class="scroll-list" id="conn-rows">
+                        {f['conn-rows']}
                     </div>
                 </div>
             </div>
@@ -306,76 +631,523 @@ def render_html(health, ports):
                         <div class="col mono">Port</div>
                         <div class="col mono">Addr</div>
                         <div class="col">Scope</div>
+                        <div class="col">Process</div>
                     </div>
-                    <div class="scroll-list">
-                        {port_rows}
+                    <div class="scroll-list" id="port-rows">
+                        {f['port-rows']}
                     </div>
                 </div>
             </div>
         </div>
         
-        <script>
-            const select = document.getElementById("refreshInterval");
-            let timer = null;
+    """
+    return _PAGE_HEAD + body + _PAGE_TAIL
 
-            // Load saved preference
-            const saved = localStorage.getItem("refresh_interval");
-            if (saved !== null) {{
-                select.value = saved;
-            }} else {{
-                select.value = "60"; // Default
-            }}
+# --- FLEET VIEW ---
 
-            function updateRefresh() {{
-                const val = select.value;
-                localStorage.setItem("refresh_interval", val);
-                
-                if (timer) clearTimeout(timer);
-                
-                if (val !== "0") {{
-                    const ms = parseInt(val) * 1000;
-                    timer = setTimeout(() => window.location.reload(), ms);
-                    console.log("Refreshing in " + ms + "ms");
-                }}
-            }}
+def render_fleet_fragments(nodes):
+    rows = []
+    for n in nodes:
+        n = escape_all(n)
+        if not n['ok']:
+            status_color, status = red, "Unreachable" if n['age'] is None else "Stale"
+        else:
+            status_color = green if n['status'] == "Online" else orange
+            status = n['status']
+        dash = lambda value, unit="": "-" if value is None else f"{value}{unit}"
+        detail = n['error'] or f"{n['latency_ms']} ms"
+        rows.append(f"""
+        <div class="table-row">
+            <div class="col mono"><a href="/fleet/{n['name']}" style="color: {orange};">{n['name']}</a></div>
+            <div class="col" style="color: {status_color};">{status}</div>
+            <div class="col" style="color: {text_main};">{dash(n['uptime'])}</div>
+            <div class="col right" style="color: {purple};">{dash(n['cpu_percent'], '%')}</div>
+            <div class="col right" style="color: {text_main};">{dash(n['load'])}</div>
+            <div class="col right" style="color: {blue};">{dash(n['memory_percent'], '%')}</div>
+            <div class="col right" style="color: {text_main};">{dash(n['temperature'], '°C')}</div>
+            <div class="col right" style="color: {text_main};">{dash(n['listeners'])}</div>
+            <div class="col" style="color: {text_muted};" title="{detail}">{dash(n['age'], 's ago')} · {detail}</div>
+        </div>""")
+    up = sum(1 for n in nodes if n['ok'])
+    return {
+        "fleet-rows": "".join(rows),
+        "nav-status": f"""
+                <span style="width: 8px; height: 8px; background: {green if up == len(nodes) else red}; border-radius: 50%; display: inline-block;"></span>
+                {up}/{len(nodes)} nodes up""",
+    }
 
-            // Init
-            updateRefresh();
-        </script>
-    </body>
-    </html>
+def render_fleet(fragments):
+    f = fragments
+    body = f"""
+    <body data-events="/fleet/events">
+        <div class="navbar">
+            <h1>Pi5 Fleet</h1>
+            {_REFRESH_SELECT}
+            <div id="nav-status" style="margin-left: auto; color: var(--muted); font-size: 12px; display: flex; align-items: center; gap: 8px;">{f['nav-status']}
+            </div>
+        </div>
+
+        <div class="dashboard-grid">
+            <div class="panel panel-ports">
+                <div class="panel-header">Nodes</div>
+                <div class="panel-content">
+                    <div class="table-row table-header">
+                        <div class="col">Node</div>
+                        <div class="col">Status</div>
+                        <div class="col">Uptime</div>
+                        <div class="col right">CPU</div>
+                        <div class="col right">Load</div>
+                        <div class="col right">Memory</div>
+                        <div class="col right">Temp</div>
+                        <div class="col right">Listeners</div>
+                        <div class="col">Last Poll</div>
+                    </div>
+                    <div id="fleet-rows">
+                        {f['fleet-rows']}
+                    </div>
+                </div>
+            </div>
+        </div>
     """
-    return html
+    return _PAGE_HEAD + body + _PAGE_TAIL
+
+_fleet_cache = (None, {})
+_node_cache = {}  # node -> (agent version, fragments)
+
+def current_fleet_fragments():
+    global _fleet_cache
+    version, changed, nodes = fleet.summary()
+    if _fleet_cache[0] != version:
+        _fleet_cache = (version, render_fleet_fragments(nodes))
+    return _fleet_cache
+
+def node_fragments(name):
+    # -> (version, fragments) for one agent, or (None, None) before its
+    # first good poll
+    node = fleet.node(name)
+    if node is None:
+        return None, None
+    version, health, ports = node
+    cached = _node_cache.get(name)
+    if cached is None or cached[0] != version:
+        cached = _node_cache[name] = (version, render_fragments(health, ports))
+    return cached
 
 # --- SERVER HANDLER ---
 
 class Handler(BaseHTTPRequestHandler):
-    def _send_response(self, content, content_type="application/json"):
-        self.send_response(200)
+    # Keep-alive: every response must carry a Content-Length
+    protocol_version = "HTTP/1.1"
+    # Idle keep-alive connections give their worker back after this long
+    timeout = 15
+    # Set once the connection has been handed to another thread
+    detached = False
+    # Set once a request has been served on this connection
+    kept_alive = False
+    # Headers and body go out in separate writes; don't let Nagle hold the
+    # body back waiting for a delayed ACK on keep-alive connections
+    disable_nagle_algorithm = True
+
+    def _send_response(self, content, content_type="application/json", age=None, headers=(), status=200, cache=None):
+        # `content` may be a function producing the body. With
+        # cache=(key, version) the finished, possibly gzipped, body is
+        # reused for as long as the version stays the same.
+        gzipped = self._accepts_gzip()
+        slot = entry = None
+        if cache is not None:
+            slot = (cache[0], content_type, gzipped)
+            entry = _encoded.get(slot)
+            if entry is not None and entry[0] != cache[1]:
+                entry = None
+        if entry is None:
+            with stats.timer("render", cache[0] if cache else content_type):
+                body = content() if callable(content) else content
+                body = body.encode() if isinstance(body, str) else body
+            encoding = None
+            if gzipped and len(body) >= GZIP_MIN_BYTES:
+                with stats.timer("gzip", cache[0] if cache else content_type):
+                    body, encoding = gzip.compress(body, 6, mtime=0), "gzip"
+            entry = (cache and cache[1], body, encoding)
+            if slot is not None:
+                _encoded[slot] = entry
+        version, body, encoding = entry
+
+        self.send_response(status)
         self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept, Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        if age is not None:
+            self.send_header("Age", str(int(age)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_data(self, data, age=None, headers=(), status=200, cache=None):
+        # JSON-shaped API responses in the representation the client asked
+        # for; `data` may be a function, only called when not cached
+        if self.query.get("format") == "msgpack" or wire.CONTENT_TYPE in self.headers.get("Accept", ""):
+            fmt = "msgpack"
+        else:
+            fmt = "pretty" if self.query.get("pretty") == "1" else "json"
+        content_type, encode = FORMATS[fmt]
+        produce = lambda: encode(data() if callable(data) else data)
+        self._send_response(produce, content_type, age, headers, status, cache and (f"{cache[0]}.{fmt}", cache[1]))
+
+    def _accepts_gzip(self):
+        for coding in self.headers.get("Accept-Encoding", "").split(","):
+            name, _, params = coding.partition(";")
+            if name.strip() in ("gzip", "*"):
+                return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+        return False
+
+    def _validators(self, version, changed):
+        # ETag/Last-Modified follow the snapshot version; returns the
+        # headers to send, or None once a 304 has been sent. The tag is
+        # weak: gzip, identity, JSON and msgpack bodies of one version share it.
+        tag = f'"{RUN_ID}-{version}"'
+        headers = [("ETag", "W/" + tag), ("Last-Modified", formatdate(changed, usegmt=True))]
+        tags = {t.strip().replace("W/", "", 1) for t in self.headers.get("If-None-Match", "").split(",")}
+        if tag in tags or "*" in tags:
+            self._send_empty(304, headers)
+            return None
+        return headers
+
+    def _send_empty(self, code, headers=()):
+        self.send_response(code)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
         self.end_headers()
-        self.wfile.write(content.encode())
+
+    def _send_unavailable(self):
+        # No sample collected yet for a probe this route depends on
+        self._send_empty(503, [("Retry-After", "5")])
+
+    def handle_one_request(self):
+        # Between requests on a kept-alive connection the worker only waits;
+        # the server may cut that short when others are queued for a worker.
+        # Checked here as well, for connections queued before this one was
+        # marked idle.
+        if self.kept_alive:
+            self.server.idle.add(self.connection)
+            if self.server.starved():
+                self.server.idle.discard(self.connection)
+                self.close_connection = True
+                return
+        try:
+            super().handle_one_request()
+        finally:
+            self.server.idle.discard(self.connection)
+        self.kept_alive = True
+
+    def parse_request(self):
+        self.server.idle.discard(self.connection)
+        return super().parse_request()
 
     def do_GET(self):
-        if self.path == "/ports":
-            data = monitoring.get_listening_ports()
-            self._send_response(json.dumps(data, indent=2))
+        started = time.perf_counter()
+        path = urlsplit(self.path).path
+        try:
+            self._dispatch()
+        finally:
+            # Event streams run on for as long as the client wants, on
+            # their own thread; only the hand-off happens here
+            if not path.endswith("/events"):
+                if path not in ROUTES:
+                    path = "/fleet/<node>" if path.startswith("/fleet/") else "other"
+                stats.observe("route", path, time.perf_counter() - started)
+
+    def log_request(self, code="-", size="-"):
+        stats.count("responses", str(code))
+        super().log_request(code, size)
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        path = url.path
+        query = self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if path == "/" and fleet is not None:
+            self._send_empty(302, [("Location", "/fleet")])
+
+        elif path == "/ports":
+            collector.get("ports")
+            version, changed, results = collector.snapshot()
+            if "ports" not in results:
+                return self._send_unavailable()
+            headers = self._validators(version, changed)
+            if headers is None:
+                return
+            self._send_data(results["ports"], age=collector.age("ports"), headers=headers, cache=("ports", version))
 
-        elif self.path == "/health":
-            data = monitoring.get_health()
-            self._send_response(json.dumps(data, indent=2))
+        elif path == "/health":
+            collector.ready()
+            version, changed, results = collector.snapshot()
+            if not results:
+                return self._send_unavailable()
+            # Not cached: probe ages, staleness, timeouts and the scheduler
+            # move on their own, without the data version changing
+            data = collector.health(results)
+            data["probes"] = collector.status()
+            data["scheduler"] = collector.scheduler_status()
+            self._send_data(data, age=collector.age())
 
-        elif self.path == "/":
+        elif path == "/":
             # Gather all data for the HTML view
-            health_data = monitoring.get_health()
-            ports_data = monitoring.get_listening_ports()
-            html_content = render_html(health_data, ports_data)
-            self._send_response(html_content, "text/html")
+            collector.ready()
+            version, changed, results = collector.snapshot()
+            if not results:
+                return self._send_unavailable()
+            headers = self._validators(version, changed)
+            if headers is None:
+                return
+            page = lambda: render_html(collector.health(results), results.get("ports", []), current_fragments()[1])
+            self._send_response(page, "text/html", age=collector.age(), headers=headers, cache=("page", version))
+
+        elif path == "/events":
+            self._stream_events(collector.wait_for_change, current_fragments)
+
+        elif path == "/metrics":
+            # Never blocks on a probe: scrapes get whatever was last collected
+            version, changed, results = collector.snapshot()
+            body = lambda: metrics.exposition(version, collector.health(results) if results else None, results.get("ports"))
+            if SELF_METRICS:
+                # Changes with every request, so never cached
+                self._send_response(body() + stats.exposition().encode(), metrics.CONTENT_TYPE)
+            else:
+                self._send_response(body, metrics.CONTENT_TYPE, cache=("metrics", version))
+
+        elif path == "/debug/stats":
+            data = stats.snapshot()
+            data["probes"] = collector.status()
+            self._send_data(data)
+
+        elif path == "/debug/profile":
+            if not PROFILING:
+                return self._send_empty(404)
+            self._send_profile(query)
+
+        elif path == "/ports/changes":
+            try:
+                cursor = int(query.get("since", 0))
+            except ValueError:
+                return self._send_data({"error": "since must be an event id"}, status=400)
+            self._send_data(port_watch.since(cursor, query.get("scope")))
+
+        elif path == "/history":
+            self._send_history(query)
+
+        elif path == "/fleet" or path.startswith("/fleet/"):
+            if fleet is None:
+                return self._send_empty(404)
+            self._send_fleet(unquote(path[len("/fleet/"):]) if path != "/fleet" else "")
+
+        else:
+            self._send_empty(404)
+
+    def _send_profile(self, query):
+        # /debug/profile?seconds=10&hz=100 -> collapsed stacks of every
+        # thread, ready for flamegraph.pl or speedscope
+        try:
+            seconds = float(query.get("seconds", 10))
+            hz = float(query.get("hz", 100))
+            # nan slips through the clamps in profiler.sample
+            if not (math.isfinite(seconds) and math.isfinite(hz)):
+                raise ValueError
+        except ValueError:
+            return self._send_data({"error": "seconds and hz must be finite numbers"}, status=400)
+        stacks = profiler.sample(seconds, hz)
+        if stacks is None:
+            # Another profile is running
+            return self._send_empty(409)
+        self._send_response(profiler.collapsed(stacks), "text/plain; charset=utf-8")
+
+    def _send_history(self, query):
+        metric = query.get("metric")
+        if metric == "reboots":
+            return self._send_data({"metric": "reboots", "events": list(history.reboots)})
+        try:
+            seconds = parse_range(query.get("range", "1h"))
+        except (ValueError, OverflowError):
+            seconds = None
+        data = history.query(metric, seconds) if seconds and seconds > 0 else None
+        if data is None:
+            error = {"error": "unknown metric or bad range", "metrics": sorted(history.metrics) + ["reboots"]}
+            return self._send_data(error, status=400)
+        self._send_data(data)
 
+    def _send_fleet(self, rest):
+        # /fleet, /fleet/events, /fleet/nodes, and per node
+        # /fleet/<node>[/events|/health|/ports]
+        if rest == "":
+            version, fragments = current_fleet_fragments()
+            headers = self._validators(version, fleet.changed)
+            if headers is not None:
+                self._send_response(lambda: render_fleet(fragments), "text/html", headers=headers, cache=("fleet", version))
+        elif rest == "events":
+            self._stream_events(fleet.wait_for_change, current_fleet_fragments)
+        elif rest == "nodes":
+            self._send_data(fleet.summary()[2])
         else:
-            self.send_response(404)
-            self.end_headers()
+            name, _, view = rest.partition("/")
+            if name not in fleet.agents:
+                return self._send_empty(404)
+            node = fleet.node(name)
+            if view == "events":
+                self._stream_events(fleet.wait_for_change, lambda: node_fragments(name))
+            elif node is None:
+                self._send_unavailable()
+            elif view == "health":
+                # Like /health: the node's probe status moves without its version
+                self._send_data(node[1])
+            elif view == "ports":
+                self._send_data(node[2], cache=(f"fleet/{name}/ports", node[0]))
+            elif view == "":
+                page = lambda: render_html(node[1], node[2], node_fragments(name)[1], title=html.escape(name),
+                                           events=f"/fleet/{name}/events")
+                self._send_response(page, "text/html", cache=(f"fleet/{name}", node[0]))
+            else:
+                self._send_empty(404)
+
+    def _stream_events(self, wait_for_change, current):
+        # The stream is handed to a thread of its own and the worker goes
+        # back to the pool, so open dashboards never hold up /metrics
+        # scrapes or page loads. The streams themselves are capped.
+        if not _streams.acquire(blocking=False):
+            self.close_connection = True
+            return self._send_empty(503, [("Retry-After", "5"), ("Connection", "close")])
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        self.detached = True
+        threading.Thread(target=self._write_events, args=(wait_for_change, current),
+                         name="events", daemon=True).start()
+
+    def _write_events(self, wait_for_change, current):
+        # Server-Sent Events: each client only gets the fragments that
+        # differ from what it was last sent; the rendering is shared.
+        # current() -> (event id, fragments)
+        sent = {}
+        version = None
+        try:
+            while True:
+                version = wait_for_change(version, EVENTS_KEEPALIVE)
+                event_id, fragments = current()
+                changed = {k: v for k, v in (fragments or {}).items() if sent.get(k) != v}
+                if changed:
+                    self.request.sendall(f"id: {event_id}\ndata: {json.dumps(changed)}\n\n".encode())
+                    sent = fragments
+                else:
+                    self.request.sendall(b": keep-alive\n\n")
+        except OSError:
+            # Client went away
+            pass
+        finally:
+            self.server.shutdown_request(self.request)
+            _streams.release()
+
+class PooledHTTPServer(HTTPServer):
+    # Connections are served by a fixed pool of worker threads; at most
+    # `queue` more may wait for a worker, anything beyond that gets a 503.
+    # When every worker is taken, one sitting on an idle keep-alive
+    # connection is freed for the newcomer: clients reconnect, as they do
+    # for any keep-alive timeout. Workers are daemon threads so they never
+    # block exit.
+    def __init__(self, address, handler, workers=16, queue=32):
+        super().__init__(address, handler)
+        self.pending = Queue()
+        self.slots = threading.BoundedSemaphore(workers + queue)
+        self.idle = set()   # kept-alive connections waiting for their next request
+        self.lock = threading.Lock()
+        self.workers = workers
+        self.busy = 0       # workers serving a connection
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"http-{i}", daemon=True).start()
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            try:
+                request.sendall(b"HTTP/1.1 503 Service Unavailable\r\n"
+                                b"Retry-After: 1\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self.pending.put((request, client_address))
+        if self.starved():
+            try:
+                # Read side only: a response still being written goes out
+                # whole, the next readline just sees EOF
+                self.idle.pop().shutdown(socket.SHUT_RD)
+            except (KeyError, OSError):
+                pass
+
+    def starved(self):
+        # More connections queued than workers free to take them
+        with self.lock:
+            return self.pending.qsize() > self.workers - self.busy
+
+    def finish_request(self, request, client_address):
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def _worker(self):
+        while True:
+            request, client_address = self.pending.get()
+            with self.lock:
+                self.busy += 1
+            detached = False
+            try:
+                detached = self.finish_request(request, client_address).detached
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                # A detached connection is closed by whoever took it over
+                if not detached:
+                    self.shutdown_request(request)
+                self.slots.release()
+                with self.lock:
+                    self.busy -= 1
 
 if __name__ == "__main__":
-    print("Server running at http://0.0.0.0:8080/")
-    HTTPServer(("0.0.0.0", 8080), Handler).serve_forever()
+    parser = argparse.ArgumentParser(description="Pi5 monitoring dashboard")
+    parser.add_argument("--host", default="0.0.0.0", help="bind address")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=16, help="request worker threads")
+    parser.add_argument("--queue", type=int, default=32, help="connections allowed to wait for a worker")
+    parser.add_argument("--streams", type=int, default=12, help="concurrent /events clients (each gets its own thread)")
+    parser.add_argument("--data-dir", help="persist metric history to this directory")
+    parser.add_argument("--self-metrics", action="store_true", help="add the monitor's own latency histograms to /metrics")
+    parser.add_argument("--profiling", action="store_true", help="enable the /debug/profile sampling profiler")
+    parser.add_argument("--agents", help="aggregator mode: comma-separated host:port of other dashboards to show on /fleet")
+    args = parser.parse_args()
+
+    SELF_METRICS = args.self_metrics
+    PROFILING = PROFILING or args.profiling
+    if args.agents:
+        fleet = Fleet([a.strip() for a in args.agents.split(",") if a.strip()])
+        fleet.start()
+
+    store = None
+    if args.data_dir:
+        store = Store(args.data_dir)
+        history.attach_store(store)
+        port_watch.attach_log(os.path.join(args.data_dir, "port_changes.log"))
+
+    _streams = threading.BoundedSemaphore(max(1, args.streams))
+
+    # docker stop sends SIGTERM, which would otherwise end the process on the
+    # spot; leave through the finally below so batched samples get written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    collector.start()
+    print(f"Server running at http://{args.host}:{args.port}/")
+    try:
+        PooledHTTPServer((args.host, args.port), Handler, args.workers, args.queue).serve_forever()
+    finally:
+        if store is not None:
+            store.close()
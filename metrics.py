@@ -0,0 +1,137 @@
+from collections import Counter
+
+# Prometheus text exposition (version 0.0.4) rendered from the collector
+# snapshot. Output is cached per snapshot version, so a scrape between
+# collection cycles just returns the same bytes.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HELP = {
+    "pi5_uptime_seconds": ("gauge", "Seconds since the host booted"),
+    "pi5_network_up": ("gauge", "Whether the reachability probe got an answer"),
+    "pi5_dns_up": ("gauge", "Whether any resolver answered"),
+    "pi5_ping_rtt_seconds": ("gauge", "Mean reachability probe round-trip time"),
+    "pi5_ping_loss_ratio": ("gauge", "Fraction of reachability probes lost"),
+    "pi5_dns_resolve_seconds": ("gauge", "Resolver answer time per resolver and name"),
+    "pi5_process_resident_bytes": ("gauge", "Resident memory of the top processes"),
+    "pi5_process_cpu_percent": ("gauge", "Interval CPU usage of the top processes"),
+    "pi5_listeners": ("gauge", "Listening sockets by protocol and scope"),
+    "pi5_tcp_connections": ("gauge", "TCP sockets by state"),
+    "pi5_tcp_port_established": ("gauge", "Established connections per local listening port"),
+    "pi5_cpu_usage_percent": ("gauge", "CPU busy time over the last sample interval, per core and total"),
+    "pi5_load_average": ("gauge", "System load average"),
+    "pi5_memory_total_bytes": ("gauge", "Physical memory"),
+    "pi5_memory_available_bytes": ("gauge", "Memory available without swapping"),
+    "pi5_disk_read_bytes_per_second": ("gauge", "Disk read rate"),
+    "pi5_disk_write_bytes_per_second": ("gauge", "Disk write rate"),
+    "pi5_temperature_celsius": ("gauge", "Thermal zone temperature"),
+    "pi5_network_receive_bytes_total": ("counter", "Bytes received per interface"),
+    "pi5_network_transmit_bytes_total": ("counter", "Bytes sent per interface"),
+}
+
+# Pre-built "# HELP/# TYPE" headers
+_HEADERS = {name: f"# HELP {name} {text}\n# TYPE {name} {kind}\n" for name, (kind, text) in HELP.items()}
+
+# Label strings are reused across scrapes as long as the label values stay
+# the same (e.g. the same process keeps its pid/name)
+_labels = {}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_string(*pairs):
+    labels = _labels.get(pairs)
+    if labels is None:
+        if len(_labels) > 10000:
+            _labels.clear()
+        labels = _labels[pairs] = "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in zip(pairs[::2], pairs[1::2])) + "}"
+    return labels
+
+
+def render(health, ports):
+    out = []
+
+    def sample(name, value, labels=""):
+        if value is not None:
+            out.append(f"{name}{labels} {value}\n")
+
+    if health is not None:
+        out.append(_HEADERS["pi5_uptime_seconds"])
+        sample("pi5_uptime_seconds", health["uptime_seconds"])
+        out.append(_HEADERS["pi5_network_up"])
+        sample("pi5_network_up", int(health["network"]))
+        out.append(_HEADERS["pi5_dns_up"])
+        sample("pi5_dns_up", int(health["dns"]))
+
+        rtt = health["ping"]["rtt_ms"]
+        out.append(_HEADERS["pi5_ping_rtt_seconds"])
+        sample("pi5_ping_rtt_seconds", None if rtt is None else rtt / 1000)
+        out.append(_HEADERS["pi5_ping_loss_ratio"])
+        sample("pi5_ping_loss_ratio", health["ping"]["loss"])
+
+        out.append(_HEADERS["pi5_dns_resolve_seconds"])
+        for r in health["resolvers"]:
+            if r["ms"] is not None:
+                sample("pi5_dns_resolve_seconds", r["ms"] / 1000, _label_string("server", r["server"], "name", r["name"]))
+
+        out.append(_HEADERS["pi5_process_resident_bytes"])
+        for p in health["processes"]:
+            sample("pi5_process_resident_bytes", int(p["memory_mb"] * 1024 * 1024), _label_string("pid", p["pid"], "name", p["name"]))
+        out.append(_HEADERS["pi5_process_cpu_percent"])
+        for p in health["cpu_processes"]:
+            sample("pi5_process_cpu_percent", p["cpu_percent"], _label_string("pid", p["pid"], "name", p["name"]))
+
+        system = health["system"]
+        out.append(_HEADERS["pi5_cpu_usage_percent"])
+        sample("pi5_cpu_usage_percent", system["cpu_percent"], _label_string("cpu", "all"))
+        for n, cpu in enumerate(system["cores"]):
+            sample("pi5_cpu_usage_percent", cpu, _label_string("cpu", n))
+        out.append(_HEADERS["pi5_load_average"])
+        for period, value in zip(("1m", "5m", "15m"), system["load"] or ()):
+            sample("pi5_load_average", value, _label_string("period", period))
+        if system["memory"]:
+            out.append(_HEADERS["pi5_memory_total_bytes"])
+            sample("pi5_memory_total_bytes", int(system["memory"]["total_mb"] * 1024 * 1024))
+            out.append(_HEADERS["pi5_memory_available_bytes"])
+            sample("pi5_memory_available_bytes", int(system["memory"]["available_mb"] * 1024 * 1024))
+        out.append(_HEADERS["pi5_disk_read_bytes_per_second"])
+        for d in system["disks"]:
+            sample("pi5_disk_read_bytes_per_second", d["read_bps"], _label_string("device", d["name"]))
+        out.append(_HEADERS["pi5_disk_write_bytes_per_second"])
+        for d in system["disks"]:
+            sample("pi5_disk_write_bytes_per_second", d["write_bps"], _label_string("device", d["name"]))
+        out.append(_HEADERS["pi5_temperature_celsius"])
+        for t in system["thermal"]:
+            sample("pi5_temperature_celsius", t["celsius"], _label_string("zone", t["zone"]))
+
+        out.append(_HEADERS["pi5_tcp_connections"])
+        for state, count in sorted(health["connections"]["states"].items()):
+            sample("pi5_tcp_connections", count, _label_string("state", state))
+        out.append(_HEADERS["pi5_tcp_port_established"])
+        for c in health["connections"]["by_port"]:
+            sample("pi5_tcp_port_established", c["connections"], _label_string("port", c["port"]))
+        out.append(_HEADERS["pi5_network_receive_bytes_total"])
+        for i in health["interfaces"]:
+            sample("pi5_network_receive_bytes_total", i["rx_bytes"], _label_string("interface", i["name"]))
+        out.append(_HEADERS["pi5_network_transmit_bytes_total"])
+        for i in health["interfaces"]:
+            sample("pi5_network_transmit_bytes_total", i["tx_bytes"], _label_string("interface", i["name"]))
+
+    if ports is not None:
+        out.append(_HEADERS["pi5_listeners"])
+        counts = Counter((p["protocol"], p["scope"]) for p in ports)
+        for (protocol, scope), count in sorted(counts.items()):
+            sample("pi5_listeners", count, _label_string("protocol", protocol, "scope", scope))
+
+    return "".join(out)
+
+
+_cache = (None, b"")
+
+
+def exposition(version, health, ports):
+    global _cache
+    if _cache[0] != version:
+        _cache = (version, render(health, ports).encode())
+    return _cache[1]
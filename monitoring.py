@@ -1,46 +1,99 @@
 
+import os
 import platform
 import sys
+from concurrent.futures import ThreadPoolExecutor, wait
 
-# Select backend based on OS
-if platform.system() == "Darwin":
-    import monitoring_darwin as backend
-else:
-    import monitoring_linux as backend
+import dnsprobe
+import reachability
+import registry
+from registry import register
+from util import format_uptime
+
+# Both backends register their probes on import; registry.available()
+# only hands out the ones for this platform
+import monitoring_darwin
+import monitoring_linux
+backend = monitoring_darwin if platform.system() == "Darwin" else monitoring_linux
 
 # Expose backend functions directly
 get_listening_ports = backend.get_listening_ports
 get_uptime = backend.get_uptime
-check_network = backend.check_network
-check_dns = backend.check_dns
+get_uptime_seconds = backend.get_uptime_seconds
 get_top_processes = backend.get_top_processes
+get_top_cpu_processes = backend.get_top_cpu_processes
+get_connections = backend.get_connections
+get_interfaces = backend.get_interfaces
+get_system = backend.get_system
 
-def network_status():
-    network_ok = check_network()
-    dns_ok = check_dns()
+# Upper bound for a whole get_health call, in seconds; probes still
+# running past it are reported as timed out
+HEALTH_DEADLINE = float(os.environ.get("HEALTH_DEADLINE", 3))
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="health")
+
+@register("ping", interval=5, timeout=5, cost=1, default={"reachable": False, "rtt_ms": None, "loss": 1.0})
+def get_ping():
+    return reachability.probe()
+
+@register("resolvers", interval=10, timeout=3, cost=1, default=[])
+def get_resolvers():
+    return dnsprobe.probe()["resolvers"]
+
+def check_network():
+    return reachability.probe()["reachable"]
+
+def check_dns():
+    return dnsprobe.probe()["ok"]
 
+def overall_status(network_ok, dns_ok):
     if network_ok and dns_ok:
-        status = "Online"
+        return "Online"
     elif network_ok and not dns_ok:
-        status = "DNS Error"
+        return "DNS Error"
     else:
-        status = "Offline"
+        return "Offline"
+
+def network_status():
+    network_ok = check_network()
+    dns_ok = check_dns()
 
     return {
         "network": network_ok,
         "dns": dns_ok,
-        "status": status
+        "status": overall_status(network_ok, dns_ok)
     }
 
+def compose_health(results, timed_out=()):
+    # Per-probe results -> the health document; probes without a result
+    # yet report their default. Ports are served on their own.
+    health = {name: results.get(name, probe.default) for name, probe in registry.available().items()}
+    health.pop("ports", None)
+    health["uptime"] = format_uptime(health["uptime_seconds"])
+    health["network"] = health["ping"]["reachable"]
+    health["dns"] = any(r["ok"] for r in health["resolvers"])
+    health["status"] = overall_status(health["network"], health["dns"])
+    health["timed_out"] = list(timed_out)
+    return health
+
 def get_health():
-    net_stat = network_status()
-    return {
-        "uptime": get_uptime(),
-        "network": net_stat["network"],
-        "dns": net_stat["dns"],
-        "status": net_stat["status"],
-        "processes": get_top_processes()
-    }
+    # One-off run of every probe at once, bounded by HEALTH_DEADLINE; the
+    # dashboard uses the collector's scheduled results instead
+    probes = registry.available()
+    probes.pop("ports", None)
+    futures = {name: _executor.submit(p.func) for name, p in probes.items()}
+    wait(futures.values(), timeout=HEALTH_DEADLINE)
+
+    results = {}
+    timed_out = []
+    for name, future in futures.items():
+        if not future.done():
+            timed_out.append(name)
+        elif future.exception() is not None:
+            print(f"Error {name}: {future.exception()}")
+        else:
+            results[name] = future.result()
+    return compose_health(results, timed_out)
 
 # Main execution for testing
 if __name__ == "__main__":
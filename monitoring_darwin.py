@@ -1,14 +1,27 @@
 
+
 import subprocess
 import re
-import socket
+import os
 import time
-from util import classify_scope
+from collections import Counter
+import stats
+from registry import register
+from util import EMPTY_CONNECTIONS, EMPTY_SYSTEM, TOP_PROCESSES, classify_scope, format_uptime, interface_rates
+
+def _run(cmd):
+    # Every fork goes through here so /debug/stats can count and time them;
+    # a string runs through the shell
+    name = (cmd if isinstance(cmd, str) else cmd[0]).split()[0]
+    stats.count("forks", name)
+    with stats.timer("command", name):
+        return subprocess.run(cmd, shell=isinstance(cmd, str), text=True, capture_output=True)
 
+@register("ports", interval=30, timeout=10, cost=60, platform="darwin", default=[])
 def get_listening_ports():
     listeners = []
     cmd = "lsof -i -P -n | grep LISTEN"
-    result = subprocess.run(cmd, shell=True, text=True, capture_output=True)
+    result = _run(cmd)
     for line in result.stdout.splitlines():
         parts = line.split()
         if len(parts) < 9: continue
@@ -29,63 +42,145 @@ def get_listening_ports():
                 "ip": ip,
                 "port": int(port),
                 "family": family,
-                "scope": classify_scope(ip)
+                "scope": classify_scope(ip),
+                "pid": int(parts[1]),
+                "process": parts[0].replace("\\x20", " ")
             })
             
     listeners.sort(key=lambda x: x["port"])
     return listeners
 
-def get_uptime():
+@register("connections", interval=10, timeout=5, cost=30, platform="darwin", default=EMPTY_CONNECTIONS)
+def get_connections(limit=10):
+    # netstat: Proto Recv-Q Send-Q Local Foreign (state), with
+    # addresses written as ip.port
+    states = Counter()
+    by_port = Counter()
+    peers = Counter()
+    listen_ports = set()
+    result = _run(["netstat", "-anp", "tcp"])
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) < 6 or not parts[0].startswith("tcp"): continue
+        state = parts[5].lower()
+        states[state] += 1
+        local_port = parts[3].rsplit(".", 1)[-1]
+        if state == "established":
+            by_port[local_port] += 1
+            peers[parts[4].rsplit(".", 1)[0]] += 1
+        elif state == "listen":
+            listen_ports.add(local_port)
+
+    served = [(port, n) for port, n in by_port.most_common() if port in listen_ports][:limit]
+    return {
+        "established": states["established"],
+        "states": dict(states),
+        "by_port": [{"port": int(port), "connections": n} for port, n in served],
+        "top_peers": [{"ip": ip, "connections": n} for ip, n in peers.most_common(limit)]
+    }
+
+@register("interfaces", interval=5, timeout=3, cost=10, platform="darwin", default=[])
+def get_interfaces():
+    # netstat -ibn: one <Link#n> row per interface carries the counters;
+    # read from the right since the Address column can be empty
+    counters = {}
+    result = _run(["netstat", "-ibn"])
+    for line in result.stdout.splitlines()[1:]:
+        parts = line.split()
+        if len(parts) < 10 or not parts[2].startswith("<Link#") or parts[0].startswith("lo"): continue
+        try:
+            counters[parts[0]] = (int(parts[-5]), int(parts[-7]), int(parts[-2]), int(parts[-4]))
+        except ValueError:
+            continue
+    return interface_rates(counters)
+
+_boot_time = None
+
+@register("uptime_seconds", interval=5, timeout=3, cost=0.1, platform="darwin")
+def get_uptime_seconds():
+    # Boot time never changes, so sysctl only runs once
+    global _boot_time
     try:
-        cmd = "sysctl -n kern.boottime"
-        result = subprocess.run(cmd, shell=True, text=True, capture_output=True)
-        match = re.search(r"sec = (\d+)", result.stdout)
-        if match:
-            boot_time = int(match.group(1))
-            seconds = time.time() - boot_time
-        else:
-            seconds = 0
-            
-        minutes = int(seconds // 60)
-        hours = minutes // 60
-        days = hours // 24
-        return f"{int(days)}d {int(hours % 24)}h {int(minutes % 60)}m"
+        if _boot_time is None:
+            cmd = "sysctl -n kern.boottime"
+            result = _run(cmd)
+            match = re.search(r"sec = (\d+)", result.stdout)
+            if not match:
+                return None
+            _boot_time = int(match.group(1))
+        return time.time() - _boot_time
     except Exception as e:
         print(f"Error uptime: {e}")
-        return "Unknown"
-
-def check_network():
-    # macOS: -W 1000 (1000 ms)
-    res = subprocess.run(["ping", "-c", "1", "-W", "1000", "8.8.8.8"], stdout=subprocess.DEVNULL)
-    return res.returncode == 0
+        return None
 
-def check_dns():
-    try:
-        socket.setdefaulttimeout(1)
-        socket.gethostbyname("google.com")
-        return True
-    except:
-        return False
+def get_uptime():
+    return format_uptime(get_uptime_seconds())
 
-def get_top_processes():
+def _ps_top(sort_flag, limit):
+    # sort_flag: -m sorts by memory, -r by CPU
     processes = []
     try:
-        cmd = "ps -caxm -o pid,comm,rss | head -n 6"
-        result = subprocess.run(cmd, shell=True, text=True, capture_output=True)
+        cmd = f"ps -cax{sort_flag} -o pid,comm,%cpu,rss | head -n {limit + 1}"
+        result = _run(cmd)
         lines = result.stdout.strip().splitlines()
         
         if len(lines) > 0:
             for line in lines[1:]:
                 parts = line.split()
-                if len(parts) >= 3:
+                if len(parts) >= 4:
                     pid = parts[0]
                     rss = parts[-1]
-                    comm = " ".join(parts[1:-1])
+                    comm = " ".join(parts[1:-2])
                     try:
                         rss_mb = round(int(rss) / 1024, 1)
+                        cpu = float(parts[-2])
                     except:
                         rss_mb = 0
-                    processes.append({"pid": pid, "name": comm, "memory_mb": rss_mb})
+                        cpu = 0.0
+                    processes.append({"pid": pid, "name": comm, "memory_mb": rss_mb, "cpu_percent": cpu})
     except Exception as e:
         print(f"Error processes: {e}")
     return processes
+
+@register("processes", interval=5, timeout=5, cost=30, platform="darwin", default=[])
+def get_top_processes(limit=TOP_PROCESSES):
+    return _ps_top("m", limit)
+
+@register("cpu_processes", interval=5, timeout=5, cost=30, platform="darwin", default=[])
+def get_top_cpu_processes(limit=TOP_PROCESSES):
+    # macOS ps reports a decaying average rather than lifetime %CPU
+    return _ps_top("r", limit)
+
+_mem_total = None
+
+@register("system", interval=5, timeout=2, cost=10, platform="darwin", default=EMPTY_SYSTEM)
+def get_system():
+    # Load and memory only; per-core CPU, disk rates and temperatures need
+    # host_statistics/IOKit, which aren't reachable from the command line tools
+    global _mem_total
+    memory = None
+    try:
+        if _mem_total is None:
+            result = _run(["sysctl", "-n", "hw.memsize"])
+            _mem_total = int(result.stdout)
+        result = _run(["vm_stat"])
+        page_size = int(re.search(r"page size of (\d+)", result.stdout).group(1))
+        pages = {k.strip(): int(v.strip(" .")) for k, v in re.findall(r"^([^:\n]+):\s+(\d+)\.?$", result.stdout, re.M)}
+        available = (pages.get("Pages free", 0) + pages.get("Pages inactive", 0) + pages.get("Pages speculative", 0)) * page_size
+        memory = {
+            "total_mb": round(_mem_total / 1024 / 1024, 1),
+            "available_mb": round(available / 1024 / 1024, 1),
+            "used_percent": round((_mem_total - available) / _mem_total * 100, 1),
+            "swap_used_mb": None
+        }
+    except Exception as e:
+        print(f"Error memory: {e}")
+    return {
+        "cpu_percent": None,
+        "cores": [],
+        "load": [round(v, 2) for v in os.getloadavg()],
+        "memory": memory,
+        "disks": [],
+        "temperature": None,
+        "thermal": []
+    }
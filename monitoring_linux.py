@@ -1,90 +1,466 @@
 
-import subprocess
+import heapq
+from collections import Counter
+from array import array
+from bisect import bisect_left
+import os
 import socket
+import struct
+import threading
 import time
-from util import classify_scope
+from registry import register
+from util import EMPTY_CONNECTIONS, EMPTY_SYSTEM, TOP_PROCESSES, classify_scope, format_uptime, interface_rates
 
+PROC_ROOT = "/proc"
+
+# /proc/net table -> (protocol, family)
+PROC_NET_FILES = (
+    ("tcp", "tcp", "ipv4"),
+    ("tcp6", "tcp", "ipv6"),
+    ("udp", "udp", "ipv4"),
+    ("udp6", "udp", "ipv6"),
+)
+
+# Socket states from include/net/tcp_states.h
+TCP_ESTABLISHED = "01"
+TCP_LISTEN = "0A"
+UDP_UNCONN = "07"
+
+TCP_STATES = {
+    "01": "established", "02": "syn_sent", "03": "syn_recv", "04": "fin_wait1",
+    "05": "fin_wait2", "06": "time_wait", "07": "close", "08": "close_wait",
+    "09": "last_ack", "0A": "listen", "0B": "closing",
+}
+
+# A full walk of every fd of every process is expensive, so the socket
+# inode -> pid index is updated incrementally and only fully rebuilt when
+# a listener is unaccounted for, at most this often (seconds)
+FULL_RESCAN_INTERVAL = 60
+
+_pid_inodes = {}   # pid -> set of socket inodes it holds
+_inode_pids = {}   # socket inode -> pid
+_pid_start = {}    # pid -> start time when its fds were walked, so the
+                   # index is effectively keyed on (pid, start time)
+_last_full_scan = 0
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+# Previous CPU sample as parallel arrays sorted by PID, so the state is
+# rebuilt every cycle and never grows with process churn
+_cpu_pids = array("i")
+_cpu_starts = array("Q")
+_cpu_ticks = array("Q")
+_cpu_time = 0
+
+# Scans closer together than this reuse the last result (seconds)
+SCAN_MAX_AGE = 1.0
+_scan_time = -SCAN_MAX_AGE
+_scan_rows = []
+_scan_lock = threading.Lock()
+
+def _decode_ip(ip_hex):
+    # Each 32-bit word of the address is printed in host byte order
+    packed = b"".join(struct.pack("=I", int(ip_hex[i:i + 8], 16)) for i in range(0, len(ip_hex), 8))
+    family = socket.AF_INET if len(packed) == 4 else socket.AF_INET6
+    return socket.inet_ntop(family, packed)
+
+def _decode_address(hex_addr):
+    # "0100007F:0016" -> ("127.0.0.1", 22)
+    ip_hex, port_hex = hex_addr.split(":")
+    return _decode_ip(ip_hex), int(port_hex, 16)
+
+def _read_proc_net(name):
+    try:
+        with open(os.path.join(PROC_ROOT, "net", name)) as f:
+            f.readline()  # header
+            for line in f:
+                yield line.split()
+    except FileNotFoundError:
+        # e.g. tcp6/udp6 on a kernel with IPv6 disabled
+        return
+
+def _list_pids():
+    return {int(p) for p in os.listdir(PROC_ROOT) if p.isdigit()}
+
+def _read_identity(pid):
+    # -> (start time, command name) from /proc/<pid>/stat, or None once
+    # the process is gone. The start time tells a reused PID apart; the
+    # name changes on exec.
+    try:
+        with open(os.path.join(PROC_ROOT, str(pid), "stat")) as f:
+            stat = f.read()
+        end = stat.rindex(")")
+        return int(stat[end + 2:].split()[19]), stat[stat.index("(") + 1:end]
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _socket_inodes(pid):
+    inodes = set()
+    fd_dir = os.path.join(PROC_ROOT, str(pid), "fd")
+    try:
+        fds = os.listdir(fd_dir)
+    except OSError:
+        # Gone, or owned by another user and we are not root
+        return inodes
+    for fd in fds:
+        try:
+            target = os.readlink(os.path.join(fd_dir, fd))
+        except OSError:
+            continue
+        if target.startswith("socket:["):
+            inodes.add(int(target[8:-1]))
+    return inodes
+
+def _forget_pid(pid):
+    for inode in _pid_inodes.pop(pid, ()):
+        if _inode_pids.get(inode) == pid:
+            del _inode_pids[inode]
+    _pid_start.pop(pid, None)
+
+def _scan_pid(pid):
+    # Identity first: if it still matches later, these fds are its own
+    identity = _read_identity(pid)
+    inodes = _socket_inodes(pid)
+    for inode in _pid_inodes.get(pid, set()) - inodes:
+        if _inode_pids.get(inode) == pid:
+            del _inode_pids[inode]
+    for inode in inodes:
+        _inode_pids[inode] = pid
+    _pid_inodes[pid] = inodes
+    _pid_start[pid] = identity and identity[0]
+
+def _update_socket_index(wanted):
+    global _last_full_scan
+    pids = _list_pids()
+
+    for pid in _pid_inodes.keys() - pids:
+        _forget_pid(pid)
+
+    # Only processes we have not seen before need their fds walked, unless
+    # an existing one opened a listener since it was last scanned
+    rescan = pids - _pid_inodes.keys()
+    now = time.time()
+    if not wanted <= _inode_pids.keys() and now - _last_full_scan > FULL_RESCAN_INTERVAL:
+        rescan = pids
+        _last_full_scan = now
+
+    for pid in rescan:
+        _scan_pid(pid)
+
+@register("ports", interval=30, timeout=10, cost=20, platform="linux", default=[])
 def get_listening_ports():
-    cmd = "ss -tulnpH | grep LISTEN"
-    result = subprocess.run(cmd, shell=True, text=True, capture_output=True)
     listeners = []
+    inodes = []
+
+    for name, proto, family in PROC_NET_FILES:
+        listen_state = TCP_LISTEN if proto == "tcp" else UDP_UNCONN
+        for fields in _read_proc_net(name):
+            if fields[3] != listen_state: continue
+            ip, port = _decode_address(fields[1])
+
+            listeners.append({
+                "protocol": proto,
+                "ip": ip,
+                "port": port,
+                "family": family,
+                "scope": classify_scope(ip)
+            })
+            inodes.append(int(fields[9]))
 
-    for line in result.stdout.splitlines():
-        parts = line.split()
-        if len(parts) < 5: continue
-        proto = parts[0]
-        local = parts[4]
-
-        # Handle IPv6 [::]:22
-        if local.startswith("["):
-            addr_port = local.split("]:")
-            ip = addr_port[0].strip("[")
-            port = addr_port[1]
-            family = "ipv6"
-        else:
-            ip_port = local.rsplit(":", 1)
-            ip_iface = ip_port[0]
-            port = ip_port[1]
-            if "%" in ip_iface:
-                ip = ip_iface.split("%", 1)[0]
-            else:
-                ip = ip_iface
-            family = "ipv4"
-
-        listeners.append({
-            "protocol": proto,
-            "ip": ip,
-            "port": int(port),
-            "family": family,
-            "scope": classify_scope(ip)
-        })
+    _update_socket_index(set(inodes))
+    # Listener owners are checked every cycle: a PID that now belongs to
+    # another process gets its fds walked again, and names are read fresh
+    names = {}
+    for pid in {_inode_pids.get(inode) for inode in inodes} - {None}:
+        identity = _read_identity(pid)
+        if identity is None:
+            _forget_pid(pid)
+            continue
+        if identity[0] != _pid_start.get(pid):
+            _scan_pid(pid)
+        names[pid] = identity[1]
+    for listener, inode in zip(listeners, inodes):
+        pid = _inode_pids.get(inode)
+        listener["pid"] = pid
+        listener["process"] = names.get(pid)
 
     listeners.sort(key=lambda x: x["port"])
     return listeners
 
-def get_uptime():
-    try:
-        with open("/proc/uptime", "r") as f:
-            seconds = float(f.read().split()[0])
-        minutes = int(seconds // 60)
-        hours = minutes // 60
-        days = hours // 24
-        return f"{int(days)}d {int(hours % 24)}h {int(minutes % 60)}m"
-    except:
-        return "Unknown"
+@register("connections", interval=10, timeout=5, cost=5, platform="linux", default=EMPTY_CONNECTIONS)
+def get_connections(limit=10):
+    # Single streaming pass over every TCP socket. Only counters are kept,
+    # keyed by the raw hex fields; just the top entries get decoded.
+    states = Counter()
+    by_port = Counter()
+    peers = Counter()
+    listen_ports = set()
+    for name in ("tcp", "tcp6"):
+        for fields in _read_proc_net(name):
+            state = fields[3]
+            states[state] += 1
+            if state == TCP_ESTABLISHED:
+                by_port[fields[1][-4:]] += 1
+                peers[fields[2][:-5]] += 1
+            elif state == TCP_LISTEN:
+                listen_ports.add(fields[1][-4:])
 
-def check_network():
-    # Linux: -W 1 (1 second)
-    res = subprocess.run(["ping", "-c", "1", "-W", "1", "8.8.8.8"], stdout=subprocess.DEVNULL)
-    return res.returncode == 0
+    # Established connections grouped by the local listening port they
+    # were accepted on; outgoing ones have ephemeral local ports
+    served = [(port, n) for port, n in by_port.most_common() if port in listen_ports][:limit]
+    return {
+        "established": states[TCP_ESTABLISHED],
+        "states": {TCP_STATES.get(k, k): n for k, n in states.items()},
+        "by_port": [{"port": int(port, 16), "connections": n} for port, n in served],
+        "top_peers": [{"ip": _decode_ip(ip), "connections": n} for ip, n in peers.most_common(limit)]
+    }
 
-def check_dns():
+@register("interfaces", interval=5, timeout=3, cost=1, platform="linux", default=[])
+def get_interfaces():
+    # name -> (rx bytes, rx packets, tx bytes, tx packets)
+    counters = {}
     try:
-        socket.setdefaulttimeout(1)
-        socket.gethostbyname("google.com")
-        return True
+        with open(os.path.join(PROC_ROOT, "net", "dev")) as f:
+            for line in f.readlines()[2:]:
+                name, data = line.split(":", 1)
+                name = name.strip()
+                if name == "lo": continue
+                fields = data.split()
+                counters[name] = (int(fields[0]), int(fields[1]), int(fields[8]), int(fields[9]))
+    except OSError:
+        return []
+    return interface_rates(counters)
+
+@register("uptime_seconds", interval=5, timeout=3, cost=0.1, platform="linux")
+def get_uptime_seconds():
+    try:
+        with open(os.path.join(PROC_ROOT, "uptime"), "r") as f:
+            return float(f.read().split()[0])
     except:
-        return False
+        return None
+
+def get_uptime():
+    return format_uptime(get_uptime_seconds())
+
+def _scan_processes():
+    # One pass over /proc/<pid>/stat gives RSS and CPU ticks for every
+    # process; get_health asks for both rankings, so a recent scan is reused
+    with _scan_lock:
+        return _scan_processes_locked()
+
+def _scan_processes_locked():
+    global _cpu_pids, _cpu_starts, _cpu_ticks, _cpu_time, _scan_time, _scan_rows
+    now = time.monotonic()
+    if now - _scan_time < SCAN_MAX_AGE:
+        return _scan_rows
+
+    pids = sorted(_list_pids())
+
+    elapsed = now - _cpu_time
+    pids_out, starts_out, ticks_out = array("i"), array("Q"), array("Q")
+    rows = []
+    for pid in pids:
+        try:
+            with open(os.path.join(PROC_ROOT, str(pid), "stat")) as f:
+                stat = f.read()
+            end = stat.rindex(")")
+            fields = stat[end + 2:].split()
+            ticks = int(fields[11]) + int(fields[12])
+            start_time = int(fields[19])
+            rss_pages = int(fields[21])
+        except (OSError, ValueError, IndexError):
+            continue
 
-def get_top_processes():
+        cpu = 0.0
+        i = bisect_left(_cpu_pids, pid)
+        # Same PID and start time as last cycle -> same process
+        if i < len(_cpu_pids) and _cpu_pids[i] == pid and _cpu_starts[i] == start_time:
+            cpu = round((ticks - _cpu_ticks[i]) / CLK_TCK / elapsed * 100, 1)
+
+        pids_out.append(pid)
+        starts_out.append(start_time)
+        ticks_out.append(ticks)
+        # The name comes from this same read: a reused PID or an exec'd
+        # process shows its current name, not one cached under the PID
+        rows.append((rss_pages, cpu, pid, stat[stat.index("(") + 1:end]))
+
+    _cpu_pids, _cpu_starts, _cpu_ticks, _cpu_time = pids_out, starts_out, ticks_out, now
+    _scan_time, _scan_rows = now, rows
+    return rows
+
+def _process_entries(top):
     processes = []
-    try:
-        cmd = "ps axo pid,comm,rss --sort=-rss | head -n 6"
-        result = subprocess.run(cmd, shell=True, text=True, capture_output=True)
-        lines = result.stdout.strip().splitlines()
-        
-        if len(lines) > 0:
-            for line in lines[1:]:
-                parts = line.split()
-                if len(parts) >= 3:
-                    pid = parts[0]
-                    rss = parts[-1]
-                    comm = " ".join(parts[1:-1])
-                    try:
-                        rss_mb = round(int(rss) / 1024, 1)
-                    except:
-                        rss_mb = 0
-                    processes.append({"pid": pid, "name": comm, "memory_mb": rss_mb})
-    except Exception as e:
-        print(f"Error processes: {e}")
+    for rss_pages, cpu, pid, comm in top:
+        rss_mb = round(rss_pages * PAGE_SIZE / 1024 / 1024, 1)
+        processes.append({"pid": str(pid), "name": comm, "memory_mb": rss_mb, "cpu_percent": cpu})
     return processes
+
+@register("processes", interval=5, timeout=5, cost=15, platform="linux", default=[])
+def get_top_processes(limit=TOP_PROCESSES):
+    # Kernel threads have no RSS; they only take part in the CPU ranking
+    return _process_entries(heapq.nlargest(limit, (row for row in _scan_processes() if row[0])))
+
+@register("cpu_processes", interval=5, timeout=5, cost=15, platform="linux", default=[])
+def get_top_cpu_processes(limit=TOP_PROCESSES):
+    rows = _scan_processes()
+    return _process_entries(heapq.nlargest(limit, rows, key=lambda row: row[1]))
+
+# --- System-wide stats ---
+
+SYS_ROOT = "/sys"
+
+# Device name prefixes in /proc/diskstats that are not real disks
+VIRTUAL_DISKS = ("loop", "ram", "zram", "dm-")
+
+class SystemStats:
+    # /proc/stat, loadavg, meminfo, diskstats and the thermal zones are kept
+    # open and re-read with pread at offset 0, which makes procfs/sysfs
+    # regenerate the content without an open/close per sample. Rates come
+    # from the deltas between two samples. The roots can point at a fake
+    # procfs/sysfs tree.
+    def __init__(self, proc_root=PROC_ROOT, sys_root=SYS_ROOT):
+        self.proc_root = proc_root
+        self.sys_root = sys_root
+        self.lock = threading.Lock()
+        self.fds = {}
+        self.zones = None   # [(zone type, temp path)], found on first use
+        self.block = None   # whole-disk names, so partitions aren't counted twice
+        self.last = None    # (monotonic time, cpu ticks, disk counters)
+
+    def _read(self, path):
+        fd = self.fds.get(path)
+        if fd is None:
+            fd = self.fds[path] = os.open(path, os.O_RDONLY)
+        try:
+            chunks = [os.pread(fd, 16384, 0)]
+            while len(chunks[-1]) == 16384:
+                chunks.append(os.pread(fd, 16384, 16384 * len(chunks)))
+        except OSError:
+            # e.g. a thermal zone that went away; reopen next time
+            os.close(self.fds.pop(path))
+            raise
+        return b"".join(chunks)
+
+    def _find_zones(self):
+        zones = []
+        thermal = os.path.join(self.sys_root, "class", "thermal")
+        try:
+            names = sorted(n for n in os.listdir(thermal) if n.startswith("thermal_zone"))
+        except OSError:
+            return zones
+        for name in names:
+            try:
+                with open(os.path.join(thermal, name, "type")) as f:
+                    kind = f.read().strip()
+            except OSError:
+                kind = name
+            zones.append((kind, os.path.join(thermal, name, "temp")))
+        return zones
+
+    def _cpu_ticks(self):
+        # "cpu" and "cpuN" lines -> (busy, total) ticks
+        ticks = {}
+        for line in self._read(os.path.join(self.proc_root, "stat")).split(b"\n"):
+            if not line.startswith(b"cpu"): break
+            fields = line.split()
+            values = [int(v) for v in fields[1:9]]
+            # idle + iowait count as not busy
+            total = sum(values)
+            ticks[fields[0].decode()] = (total - values[3] - values[4], total)
+        return ticks
+
+    def _disk_counters(self):
+        # name -> (sectors read, sectors written, ms spent doing I/O)
+        if self.block is None:
+            try:
+                self.block = set(os.listdir(os.path.join(self.sys_root, "block")))
+            except OSError:
+                self.block = set()
+        counters = {}
+        for line in self._read(os.path.join(self.proc_root, "diskstats")).split(b"\n"):
+            fields = line.split()
+            if len(fields) < 13: continue
+            name = fields[2].decode()
+            if name.startswith(VIRTUAL_DISKS) or (self.block and name not in self.block): continue
+            counters[name] = (int(fields[5]), int(fields[9]), int(fields[12]))
+        return counters
+
+    def _memory(self):
+        meminfo = {}
+        for line in self._read(os.path.join(self.proc_root, "meminfo")).split(b"\n"):
+            key, _, rest = line.partition(b":")
+            if rest:
+                meminfo[key.decode()] = int(rest.split()[0])
+        total = meminfo.get("MemTotal", 0)
+        available = meminfo.get("MemAvailable", meminfo.get("MemFree", 0))
+        swap_used = meminfo.get("SwapTotal", 0) - meminfo.get("SwapFree", 0)
+        return {
+            "total_mb": round(total / 1024, 1),
+            "available_mb": round(available / 1024, 1),
+            "used_percent": round((total - available) / total * 100, 1) if total else None,
+            "swap_used_mb": round(swap_used / 1024, 1)
+        }
+
+    def _temperatures(self):
+        if self.zones is None:
+            self.zones = self._find_zones()
+        temps = []
+        for kind, path in self.zones:
+            try:
+                temps.append({"zone": kind, "celsius": round(int(self._read(path)) / 1000, 1)})
+            except (OSError, ValueError):
+                continue
+        return temps
+
+    def sample(self):
+        with self.lock:
+            now = time.monotonic()
+            cpu = self._cpu_ticks()
+            disks = self._disk_counters()
+            load = self._read(os.path.join(self.proc_root, "loadavg")).split()
+            memory = self._memory()
+            thermal = self._temperatures()
+            last, self.last = self.last, (now, cpu, disks)
+
+        usage = {}
+        disk_rates = []
+        if last is not None:
+            then, last_cpu, last_disks = last
+            for name, (busy, total) in cpu.items():
+                prev = last_cpu.get(name)
+                if prev is not None and total > prev[1]:
+                    usage[name] = round((busy - prev[0]) / (total - prev[1]) * 100, 1)
+            elapsed = now - then
+            for name, (read, written, io_ms) in disks.items():
+                prev = last_disks.get(name)
+                if prev is None or elapsed <= 0: continue
+                disk_rates.append({
+                    "name": name,
+                    "read_bps": round((read - prev[0]) * 512 / elapsed),
+                    "write_bps": round((written - prev[1]) * 512 / elapsed),
+                    "util_percent": round(min((io_ms - prev[2]) / (elapsed * 10), 100), 1)
+                })
+
+        return {
+            "cpu_percent": usage.get("cpu"),
+            "cores": [usage.get(name) for name in cpu if name != "cpu"],
+            "load": [float(v) for v in load[:3]],
+            "memory": memory,
+            "disks": disk_rates,
+            "temperature": thermal[0]["celsius"] if thermal else None,
+            "thermal": thermal
+        }
+
+    def close(self):
+        with self.lock:
+            for fd in self.fds.values():
+                os.close(fd)
+            self.fds.clear()
+
+_system_stats = SystemStats()
+
+@register("system", interval=5, timeout=2, cost=0.2, platform="linux", default=EMPTY_SYSTEM)
+def get_system():
+    return _system_stats.sample()
@@ -0,0 +1,85 @@
+import json
+import threading
+import time
+from collections import deque
+
+
+class PortWatch:
+    # Diffs each listener snapshot against the previous one, keyed by
+    # (protocol, ip, port), and keeps the opened/closed events with
+    # increasing ids so clients can poll with a cursor
+    def __init__(self, keep=1000):
+        self.lock = threading.Lock()
+        self.previous = None
+        self.events = deque(maxlen=keep)
+        self.next_id = 1
+        self.log_path = None
+
+    def attach_log(self, path):
+        # Restore recent events and the id sequence from the append-only
+        # log, then keep appending new events to it
+        self.log_path = path
+        try:
+            with open(self.log_path) as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        # Torn last line after a crash
+                        continue
+                    self.events.append(event)
+                    self.next_id = event["id"] + 1
+        except OSError:
+            pass
+
+    def record(self, probe, result, ts=None):
+        # Collector callback
+        if probe != "ports":
+            return
+        ts = ts if ts is not None else time.time()
+        current = {(p["protocol"], p["ip"], p["port"]): p for p in result}
+        with self.lock:
+            previous, self.previous = self.previous, current
+            if previous is None:
+                # First snapshot is the baseline
+                return
+            new_events = [self._event("opened", current[key], ts) for key in sorted(current.keys() - previous.keys())]
+            new_events += [self._event("closed", previous[key], ts) for key in sorted(previous.keys() - current.keys())]
+            if not new_events:
+                return
+            self.events.extend(new_events)
+            if self.log_path:
+                with open(self.log_path, "a") as f:
+                    f.write("".join(json.dumps(event) + "\n" for event in new_events))
+
+    def _event(self, kind, listener, ts):
+        event = {
+            "id": self.next_id,
+            "time": int(ts),
+            "event": kind,
+            "protocol": listener["protocol"],
+            "ip": listener["ip"],
+            "port": listener["port"],
+            "scope": listener["scope"],
+            "pid": listener.get("pid"),
+            "process": listener.get("process")
+        }
+        self.next_id += 1
+        return event
+
+    def since(self, cursor=0, scope=None):
+        with self.lock:
+            # A cursor past the last id was handed out by an earlier run
+            # whose events were not kept (no log); start over from 0
+            reset = cursor >= self.next_id
+            if reset:
+                cursor = 0
+            events = [e for e in self.events if e["id"] > cursor and (scope is None or e["scope"] == scope)]
+            oldest = self.events[0]["id"] if self.events else self.next_id
+            return {
+                "cursor": self.next_id - 1,
+                "reset": reset,
+                # Events between the cursor and the oldest one kept were dropped
+                "truncated": reset or cursor + 1 < oldest,
+                "events": events
+            }
@@ -0,0 +1,84 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Sampling profiler for the running process: every thread's stack is
+# read with sys._current_frames() at a fixed rate and the samples are
+# aggregated into collapsed stacks ("thread;outer;...;inner count"), the
+# input format of flamegraph.pl, speedscope and friends.
+
+# Distinct stacks kept per profile; samples of any further new stack are
+# counted under one overflow line, so memory stays bounded however long
+# the profile runs
+MAX_STACKS = 5000
+# Frames kept per stack, innermost first
+MAX_DEPTH = 64
+OVERFLOW = "[other stacks]"
+
+MAX_SECONDS = 60
+MAX_HZ = 1000
+
+# Only one profile at a time
+_running = threading.Lock()
+# code object -> frame label
+_labels = {}
+
+
+def _label(code):
+    label = _labels.get(code)
+    if label is None:
+        if len(_labels) > 20000:
+            _labels.clear()
+        label = _labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+def sample(seconds=10, hz=100):
+    # -> Counter of collapsed stack -> samples, or None if another profile
+    # is already running
+    if not _running.acquire(blocking=False):
+        return None
+    try:
+        seconds = min(max(seconds, 0.1), MAX_SECONDS)
+        hz = min(max(hz, 1), MAX_HZ)
+        me = threading.get_ident()
+        stacks = Counter()
+        names = {}
+        interval = 1 / hz
+        deadline = time.monotonic() + seconds
+        next_sample = time.monotonic()
+        while next_sample < deadline:
+            frames = sys._current_frames()
+            if frames.keys() - names.keys():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                labels = []
+                while frame is not None and len(labels) < MAX_DEPTH:
+                    labels.append(_label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                stack = ";".join(reversed(labels))
+                if stack in stacks or len(stacks) < MAX_STACKS:
+                    stacks[stack] += 1
+                else:
+                    stacks[OVERFLOW] += 1
+            del frames
+            # Fixed rate: a slow sample shortens the next sleep instead of
+            # shifting every later one
+            next_sample += interval
+            delay = next_sample - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_sample = time.monotonic()
+        return stacks
+    finally:
+        _running.release()
+
+
+def collapsed(stacks):
+    return "".join(f"{stack} {n}\n" for stack, n in stacks.most_common())
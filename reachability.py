@@ -0,0 +1,142 @@
+import errno
+import os
+import selectors
+import socket
+import struct
+import time
+
+def _parse_targets(value):
+    targets = []
+    for item in value.split(","):
+        host, port = item.strip().rsplit(":", 1)
+        targets.append((host.strip("[]"), int(port)))
+    return targets
+
+# host:port pairs; ICMP echoes go to the hosts, the TCP fallback connects
+# to the ports. A closed port still proves the host is reachable.
+TARGETS = _parse_targets(os.environ.get("REACHABILITY_TARGETS", "8.8.8.8:53,1.1.1.1:443"))
+PROBE_COUNT = 3
+PROBE_TIMEOUT = 1.0
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+def _checksum(data):
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+def _echo_request(seq):
+    payload = b"pi5-monitoring"
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, 0, seq)
+    checksum = _checksum(header + payload)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum, 0, seq) + payload
+
+def _icmp_socket():
+    # Unprivileged ping sockets need net.ipv4.ping_group_range on Linux
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+    except OSError:
+        return None
+
+def _icmp_probe(sock, hosts, count, timeout):
+    # All echoes go out at once, so the worst case is a single timeout
+    sent = {}  # seq -> (host, send time)
+    rtts = {host: [] for host in hosts}
+    seq = 0
+    for host in hosts:
+        for _ in range(count):
+            seq += 1
+            try:
+                sock.sendto(_echo_request(seq), (host, 0))
+            except OSError:
+                # e.g. ENETUNREACH with no default route: counts as lost
+                continue
+            sent[seq] = (host, time.monotonic())
+
+    deadline = time.monotonic() + timeout
+    while sent:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        sock.settimeout(remaining)
+        try:
+            data = sock.recv(1024)
+        except OSError:
+            break
+        # macOS hands back the IP header as well, Linux does not
+        if data and data[0] >> 4 == 4:
+            data = data[(data[0] & 0x0F) * 4:]
+        if len(data) < 8:
+            continue
+        icmp_type, _, _, _, reply_seq = struct.unpack("!BBHHH", data[:8])
+        if icmp_type == ICMP_ECHO_REPLY and reply_seq in sent:
+            host, started = sent.pop(reply_seq)
+            rtts[host].append(time.monotonic() - started)
+    return rtts
+
+def _tcp_probe(targets, count, timeout):
+    sel = selectors.DefaultSelector()
+    rtts = {target: [] for target in targets}
+    for target in targets:
+        family = socket.AF_INET6 if ":" in target[0] else socket.AF_INET
+        for _ in range(count):
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            err = sock.connect_ex(target)
+            if err not in (0, errno.EINPROGRESS, errno.ECONNREFUSED):
+                sock.close()
+                continue
+            sel.register(sock, selectors.EVENT_WRITE, (target, time.monotonic()))
+
+    deadline = time.monotonic() + timeout
+    while sel.get_map():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        for key, _ in sel.select(remaining):
+            target, started = key.data
+            err = key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            # A refused connection still means the host answered
+            if err in (0, errno.ECONNREFUSED):
+                rtts[target].append(time.monotonic() - started)
+            sel.unregister(key.fileobj)
+            key.fileobj.close()
+
+    for key in list(sel.get_map().values()):
+        key.fileobj.close()
+    sel.close()
+    return rtts
+
+def _format_target(target):
+    host, port = target
+    return f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+
+def probe(targets=None, count=PROBE_COUNT, timeout=PROBE_TIMEOUT):
+    targets = targets or TARGETS
+    rtts = None
+    sock = _icmp_socket()
+    if sock is not None:
+        with sock:
+            rtts = _icmp_probe(sock, [host for host, port in targets], count, timeout)
+        method = "icmp"
+    # Networks that drop ICMP lose every echo; try TCP before calling the
+    # host offline
+    if rtts is None or not any(rtts.values()):
+        rtts = {_format_target(target): r for target, r in _tcp_probe(targets, count, timeout).items()}
+        method = "tcp"
+
+    # Report the best-answering target
+    target, samples = max(rtts.items(), key=lambda item: len(item[1]))
+    return {
+        "reachable": len(samples) > 0,
+        "method": method,
+        "target": target,
+        "sent": count,
+        "received": len(samples),
+        "loss": round(1 - len(samples) / count, 2),
+        "rtt_ms": round(sum(samples) / len(samples) * 1000, 2) if samples else None
+    }
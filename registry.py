@@ -0,0 +1,43 @@
+import sys
+
+# name -> [Probe], filled in by the @register decorators as the modules
+# that define probes are imported. Backends register the same names for
+# different platforms, so each name keeps one entry per platform.
+PROBES = {}
+
+
+class Probe:
+    def __init__(self, name, func, interval, timeout, cost, platform, default):
+        self.name = name
+        self.func = func
+        self.interval = interval    # seconds between runs
+        self.timeout = timeout      # a run taking longer than this is reported as timed out
+        self.cost = cost            # expected CPU milliseconds per run
+        self.platform = platform    # sys.platform prefix, or None for everywhere
+        self.default = default      # reported until the first result comes in
+
+    def supported(self, platform=sys.platform):
+        return self.platform is None or platform.startswith(self.platform)
+
+
+def register(name, interval=5, timeout=3, cost=1, platform=None, default=None):
+    # Decorator: the function is called with no arguments and its return
+    # value is published under `name`
+    def decorator(func):
+        probes = PROBES.setdefault(name, [])
+        probes[:] = [p for p in probes if p.platform != platform]
+        probes.append(Probe(name, func, interval, timeout, cost, platform, default))
+        return func
+    return decorator
+
+
+def available(platform=None):
+    # -> name -> Probe for this platform; a platform-specific entry wins
+    # over one registered for everywhere
+    platform = platform or sys.platform
+    result = {}
+    for name, probes in PROBES.items():
+        supported = [p for p in probes if p.supported(platform)]
+        if supported:
+            result[name] = max(supported, key=lambda p: p.platform is not None)
+    return result
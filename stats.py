@@ -0,0 +1,121 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+# The monitor's own latency histograms and event counters, for
+# /debug/stats and (with --self-metrics) /metrics.
+
+# Upper bounds of the latency buckets, in milliseconds; one more bucket
+# catches everything slower
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_lock = threading.Lock()
+_histograms = {}    # (kind, name) -> Histogram
+_counters = Counter()  # (kind, name) -> count
+_started = time.time()
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS + (self.max_ms,), self.counts):
+            seen += n
+            if seen >= rank and n:
+                return round(min(bound, self.max_ms), 3)
+        return None
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum_ms / self.count, 3) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": {str(bound): n for bound, n in zip(BUCKETS_MS + ("+Inf",), self.counts) if n}
+        }
+
+
+def observe(kind, name, seconds):
+    with _lock:
+        histogram = _histograms.get((kind, name))
+        if histogram is None:
+            histogram = _histograms[(kind, name)] = Histogram()
+        histogram.observe(seconds * 1000)
+
+
+def count(kind, name, n=1):
+    # e.g. count("errors", "ping"), count("forks", "lsof")
+    with _lock:
+        _counters[(kind, name)] += n
+
+
+@contextmanager
+def timer(kind, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(kind, name, time.perf_counter() - started)
+
+
+def snapshot():
+    with _lock:
+        histograms = {}
+        for (kind, name), histogram in sorted(_histograms.items()):
+            histograms.setdefault(kind, {})[name] = histogram.summary()
+        counters = {}
+        for (kind, name), n in sorted(_counters.items()):
+            counters.setdefault(kind, {})[name] = n
+    return {
+        "since": int(_started),
+        "histograms": histograms,
+        "counters": counters
+    }
+
+
+def exposition():
+    # Prometheus text: one histogram family per kind, one counter family
+    # per counter kind
+    out = []
+    with _lock:
+        histograms = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+    kinds = sorted({kind for (kind, name), h in histograms})
+    for kind in kinds:
+        family = f"pi5_self_{kind}_duration_seconds"
+        out.append(f"# HELP {family} Monitor's own {kind} latency\n# TYPE {family} histogram\n")
+        for (k, name), h in histograms:
+            if k != kind: continue
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            cumulative = 0
+            for bound, n in zip(BUCKETS_MS + (None,), h.counts):
+                cumulative += n
+                le = "+Inf" if bound is None else repr(bound / 1000)
+                out.append(f'{family}_bucket{{name="{label}",le="{le}"}} {cumulative}\n')
+            out.append(f'{family}_sum{{name="{label}"}} {h.sum_ms / 1000}\n')
+            out.append(f'{family}_count{{name="{label}"}} {h.count}\n')
+    for kind in sorted({kind for (kind, name), n in counters}):
+        family = f"pi5_self_{kind}_total"
+        out.append(f"# HELP {family} Monitor's own {kind}\n# TYPE {family} counter\n")
+        for (k, name), n in counters:
+            if k == kind:
+                label = name.replace("\\", "\\\\").replace('"', '\\"')
+                out.append(f'{family}{{name="{label}"}} {n}\n')
+    return "".join(out)
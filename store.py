@@ -0,0 +1,187 @@
+import json
+import mmap
+import os
+import threading
+import time
+from struct import Struct
+
+# Fixed-size record: unix time, metric id, value
+RECORD = Struct("<IIf")
+
+SEGMENT_BYTES = 4 * 1024 * 1024
+# Oldest segments are dropped once either limit is exceeded
+RETENTION_BYTES = 64 * 1024 * 1024
+RETENTION_SECONDS = 30 * 86400
+# Samples are batched in memory and written + fsync'd this often (seconds),
+# to keep SD card writes down
+FLUSH_INTERVAL = 60
+
+
+class Store:
+    # Append-only fixed-record segments: seg-<first timestamp>.dat
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.lock = threading.Lock()
+        self.pending = []  # (ts, metric id, value) not yet on disk
+        self.last_flush = time.monotonic()
+        self.ids = self._load_ids()
+        self.segments = sorted(f for f in os.listdir(path) if f.startswith("seg-") and f.endswith(".dat"))
+        # Newest timestamp written; see append
+        self.last_ts = 0
+        if self.segments:
+            self._recover(self.segments[-1])
+            self.last_ts = self._newest_ts(self.segments[-1])
+        self.file = None
+
+    def _load_ids(self):
+        try:
+            with open(os.path.join(self.path, "metrics.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_ids(self):
+        tmp = os.path.join(self.path, "metrics.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.ids, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.path, "metrics.json"))
+
+    def _recover(self, segment):
+        # A crash mid-write can leave a torn record at the end of the
+        # newest segment; cut the file back to the last whole record
+        name = os.path.join(self.path, segment)
+        size = os.path.getsize(name)
+        if size % RECORD.size:
+            with open(name, "r+b") as f:
+                f.truncate(size - size % RECORD.size)
+
+    def _newest_ts(self, segment):
+        # Timestamp of the last record, or the segment's start when empty
+        with open(os.path.join(self.path, segment), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < RECORD.size:
+                return int(segment[4:-4])
+            f.seek(size - RECORD.size)
+            return RECORD.unpack(f.read(RECORD.size))[0]
+
+    def append(self, metric, value, ts):
+        with self.lock:
+            metric_id = self.ids.get(metric)
+            if metric_id is None:
+                metric_id = self.ids[metric] = len(self.ids)
+                self._save_ids()
+            # scan() bisects segments by time, so timestamps must never go
+            # back. A clock stepped back (NTP, a Pi without an RTC) has its
+            # samples held at the newest time until it catches up.
+            self.last_ts = max(int(ts), self.last_ts)
+            self.pending.append((self.last_ts, metric_id, value))
+            if time.monotonic() - self.last_flush >= FLUSH_INTERVAL:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return
+        self.pending.sort()
+        if self.file is None or self.file.tell() >= SEGMENT_BYTES:
+            self._rotate(self.pending[0][0])
+        self.file.write(b"".join(RECORD.pack(*record) for record in self.pending))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = []
+
+    def _rotate(self, first_ts):
+        # On the first write after startup, keep appending to the segment
+        # left over from the last run if it still has room
+        reuse = self.file is None and self.segments and \
+            os.path.getsize(os.path.join(self.path, self.segments[-1])) < SEGMENT_BYTES
+        if self.file is not None:
+            self.file.close()
+        if reuse:
+            segment = self.segments[-1]
+        else:
+            segment = f"seg-{first_ts:010d}.dat"
+            self.segments.append(segment)
+        self.file = open(os.path.join(self.path, segment), "ab")
+        self._apply_retention()
+
+    def _apply_retention(self):
+        sizes = [os.path.getsize(os.path.join(self.path, s)) for s in self.segments]
+        cutoff = time.time() - RETENTION_SECONDS
+        # Never drop the segment being written
+        while len(self.segments) > 1:
+            next_start = int(self.segments[1][4:-4])
+            if sum(sizes) <= RETENTION_BYTES and next_start >= cutoff:
+                break
+            os.remove(os.path.join(self.path, self.segments.pop(0)))
+            sizes.pop(0)
+
+    def _bisect(self, mm, count, ts):
+        # First record index with a timestamp >= ts
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if RECORD.unpack_from(mm, mid * RECORD.size)[0] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def scan(self, start, end):
+        # -> (timestamp, metric id, value) of every record between start and
+        # end, oldest first, in one pass over the segments
+        with self.lock:
+            segments = list(self.segments)
+            pending = sorted(self.pending)
+        for i, segment in enumerate(segments):
+            seg_start = int(segment[4:-4])
+            seg_end = int(segments[i + 1][4:-4]) if i + 1 < len(segments) else float("inf")
+            if seg_end < start or seg_start > end:
+                continue
+            try:
+                with open(os.path.join(self.path, segment), "rb") as f:
+                    count = os.fstat(f.fileno()).st_size // RECORD.size
+                    if count == 0:
+                        continue
+                    with mmap.mmap(f.fileno(), count * RECORD.size, access=mmap.ACCESS_READ) as mm:
+                        lo = self._bisect(mm, count, start)
+                        hi = self._bisect(mm, count, end + 1)
+                        # Copied out so the mapping is not held across yields
+                        data = mm[lo * RECORD.size:hi * RECORD.size]
+            except FileNotFoundError:
+                # Dropped by retention while we were reading
+                continue
+            yield from RECORD.iter_unpack(data)
+        for record in pending:
+            if start <= record[0] <= end:
+                yield record
+
+    def query(self, metric, start, end):
+        with self.lock:
+            metric_id = self.ids.get(metric)
+        if metric_id is None:
+            return []
+        return [[ts, round(value, 3)] for ts, mid, value in self.scan(start, end) if mid == metric_id]
+
+    def metrics(self):
+        with self.lock:
+            return list(self.ids)
+
+    def names(self):
+        # metric id -> name
+        with self.lock:
+            return {metric_id: name for name, metric_id in self.ids.items()}
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,113 @@
+import http.client
+import importlib.util
+import os
+import socket
+import threading
+
+import pytest
+
+import monitoring
+
+spec = importlib.util.spec_from_file_location("html_dashboard", os.path.join(os.path.dirname(__file__), "html-dashboard.py"))
+dashboard = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(dashboard)
+
+EVIL = '<img src=x onerror="alert(1)">'
+
+
+@pytest.fixture
+def health():
+    health = monitoring.compose_health({})
+    health["processes"] = [{"pid": "7", "name": EVIL, "memory_mb": 12.0, "cpu_percent": 1.0}]
+    health["cpu_processes"] = health["processes"]
+    health["interfaces"] = [{"name": EVIL, "rx_bps": 1.0, "tx_bps": 2.0}]
+    return health
+
+
+def test_fragments_escape_every_string(health):
+    ports = [{"protocol": "tcp", "port": 22, "ip": "0.0.0.0", "scope": EVIL, "pid": EVIL, "process": EVIL}]
+    fragments = dashboard.render_fragments(health, ports)
+    page = dashboard.render_html(health, ports, fragments)
+    assert "<img" not in page
+    assert "&lt;img src=x onerror=&quot;alert(1)&quot;&gt;" in fragments["proc-rows"]
+    assert "&lt;img" in fragments["port-rows"] and "&lt;img" in fragments["traffic-rows"]
+    # The caller's data is left alone
+    assert health["processes"][0]["name"] == EVIL
+
+
+def test_fleet_rows_escape_agent_data():
+    node = {"name": "pi-1:8080", "ok": True, "error": None, "age": 1.0, "latency_ms": 3.0, "status": EVIL,
+            "uptime": EVIL, "cpu_percent": 1.0, "load": 0.5, "memory_percent": 20.0, "temperature": 50.0,
+            "listeners": 3}
+    rows = dashboard.render_fleet_fragments([node, dict(node, name="pi-2:8080", ok=False, error=EVIL)])["fleet-rows"]
+    assert "<img" not in rows
+    assert "&lt;img src=x onerror=&quot;alert(1)&quot;&gt;" in rows
+
+
+@pytest.fixture
+def server():
+    # One worker, so anything holding it shows up at once
+    server = dashboard.PooledHTTPServer(("127.0.0.1", 0), dashboard.Handler, workers=1, queue=8)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def get(port, path="/debug/stats"):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=3)
+    conn.request("GET", path)
+    response = conn.getresponse()
+    response.read()
+    return conn, response.status
+
+
+def test_event_streams_do_not_hold_workers(server):
+    streams = []
+    for _ in range(3):
+        sock = socket.create_connection(("127.0.0.1", server), timeout=3)
+        sock.sendall(b"GET /events HTTP/1.1\r\nHost: test\r\n\r\n")
+        assert sock.recv(1024).startswith(b"HTTP/1.1 200")
+        streams.append(sock)
+    assert get(server)[1] == 200
+    for sock in streams:
+        sock.close()
+
+
+def test_idle_keep_alive_gives_way(server):
+    idle, status = get(server)
+    assert status == 200
+    # The only worker waits on `idle`'s next request; a new client still
+    # gets served well inside the keep-alive timeout
+    conn, status = get(server)
+    assert status == 200
+    idle.close()
+    conn.close()
+
+
+def test_etags_do_not_survive_a_restart(server, monkeypatch):
+    dashboard.collector._store("ports", [{"protocol": "tcp", "port": 22, "ip": "0.0.0.0", "scope": "All Interfaces",
+                                          "pid": "1", "process": "sshd"}])
+    conn = http.client.HTTPConnection("127.0.0.1", server, timeout=3)
+
+    def ports(tag=None):
+        conn.request("GET", "/ports", headers={"If-None-Match": tag} if tag else {})
+        response = conn.getresponse()
+        response.read()
+        return response.status, response.getheader("ETag")
+
+    status, tag = ports()
+    assert status == 200 and tag.startswith(f'W/"{dashboard.RUN_ID}-')
+    assert ports(tag)[0] == 304
+    # Same version number, earlier run
+    version = tag.rsplit("-", 1)[1].rstrip('"')
+    assert ports(f'W/"{version}"')[0] == 200
+    monkeypatch.setattr(dashboard, "RUN_ID", "restarted")
+    assert ports(tag)[0] == 200
+    conn.close()
+
+
+@pytest.mark.parametrize("query", ["hz=nan", "seconds=nan", "seconds=inf", "hz=-inf", "hz=fast"])
+def test_profile_rejects_non_finite_parameters(server, monkeypatch, query):
+    monkeypatch.setattr(dashboard, "PROFILING", True)
+    assert get(server, f"/debug/profile?{query}")[1] == 400
@@ -0,0 +1,116 @@
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+import dnsprobe
+
+
+def stub_server(reply):
+    # UDP DNS stub on localhost; reply(query) -> list of datagrams to send back
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+
+    def serve():
+        while True:
+            try:
+                data, peer = server.recvfrom(512)
+            except OSError:
+                return
+            for datagram in reply(data):
+                server.sendto(datagram, peer)
+    threading.Thread(target=serve, daemon=True).start()
+    return server
+
+
+def response(query, rcode=0, answers=1, query_id=None):
+    header = struct.pack("!HHHHHH", struct.unpack("!H", query[:2])[0] if query_id is None else query_id,
+                         0x8180 | rcode, 1, answers, 0, 0)
+    record = struct.pack("!HHHIH4s", 0xc00c, 1, 1, 60, 4, socket.inet_aton("192.0.2.1")) * answers
+    return header + query[12:] + record
+
+
+@pytest.fixture
+def server(request):
+    server = stub_server(request.param)
+    yield server.getsockname()[1]
+    server.close()
+
+
+def test_build_query():
+    query = dnsprobe.build_query(0x1234, "www.example.com.")
+    assert query[:12] == struct.pack("!HHHHHH", 0x1234, 0x0100, 1, 0, 0, 0)
+    assert query[12:] == b"\x03www\x07example\x03com\x00" + struct.pack("!HH", 1, 1)
+
+
+def test_parse_response():
+    query = dnsprobe.build_query(0xbeef, "example.com")
+    assert dnsprobe.parse_response(response(query)) == (0xbeef, 0, 1)
+    assert dnsprobe.parse_response(response(query, rcode=3, answers=0)) == (0xbeef, 3, 0)
+    with pytest.raises(struct.error):
+        dnsprobe.parse_response(b"\x00\x01")
+
+
+@pytest.mark.parametrize("server", [lambda query: [response(query)]], indirect=True)
+def test_answered(server):
+    result = dnsprobe.probe(["127.0.0.1"], ["example.com", "example.org"], timeout=1.0, port=server)
+    assert result["ok"]
+    assert [r["name"] for r in result["resolvers"]] == ["example.com", "example.org"]
+    for r in result["resolvers"]:
+        assert r["ok"] and r["rcode"] == "NOERROR" and r["ms"] is not None and "error" not in r
+
+
+@pytest.mark.parametrize("server", [lambda query: [response(query, rcode=3, answers=0)]], indirect=True)
+def test_nxdomain_is_not_resolved(server):
+    result = dnsprobe.probe(["127.0.0.1"], ["nope.example"], timeout=1.0, port=server)
+    r, = result["resolvers"]
+    assert not result["ok"] and not r["ok"] and r["rcode"] == "NXDOMAIN"
+
+
+@pytest.mark.parametrize("server", [lambda query: [response(query, query_id=(struct.unpack("!H", query[:2])[0] + 1) % 65536),
+                                                   response(query)]], indirect=True)
+def test_mismatched_id_is_ignored(server):
+    # A spoofed or late reply with the wrong id is skipped; the real one
+    # behind it still counts
+    result = dnsprobe.probe(["127.0.0.1"], ["example.com"], timeout=1.0, port=server)
+    assert result["ok"]
+
+
+@pytest.mark.parametrize("server", [lambda query: [response(query, query_id=(struct.unpack("!H", query[:2])[0] + 1) % 65536)]],
+                         indirect=True)
+def test_only_mismatched_ids_time_out(server):
+    result = dnsprobe.probe(["127.0.0.1"], ["example.com"], timeout=0.3, port=server)
+    r, = result["resolvers"]
+    assert not r["ok"] and r["error"] == "timeout" and r["rcode"] is None
+
+
+@pytest.mark.parametrize("server", [lambda query: []], indirect=True)
+def test_timeout_is_bounded(server):
+    started = time.monotonic()
+    result = dnsprobe.probe(["127.0.0.1", "127.0.0.1"], ["a.example", "b.example"], timeout=0.3, port=server)
+    assert time.monotonic() - started < 0.6
+    assert [r["error"] for r in result["resolvers"]] == ["timeout"] * 4
+    assert not result["ok"]
+
+
+def test_connection_refused():
+    # Nothing listens on a port we just gave back: the ICMP port
+    # unreachable surfaces as ECONNREFUSED, well before the timeout
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    started = time.monotonic()
+    result = dnsprobe.probe(["127.0.0.1"], ["example.com"], timeout=2.0, port=port)
+    r, = result["resolvers"]
+    assert time.monotonic() - started < 1.0
+    assert not r["ok"] and r["error"] != "timeout"
+
+
+def test_read_resolvers(tmp_path):
+    conf = tmp_path / "resolv.conf"
+    conf.write_text("# comment\nnameserver 192.168.1.1\nsearch lan\nnameserver fe80::1%eth0\nnameserver\n")
+    assert dnsprobe.read_resolvers(str(conf)) == ["192.168.1.1", "fe80::1"]
+    assert dnsprobe.read_resolvers(str(tmp_path / "missing")) == []
@@ -0,0 +1,134 @@
+import importlib.util
+import json
+import os
+import threading
+import time
+import pytest
+
+import fleet
+import monitoring
+
+spec = importlib.util.spec_from_file_location("html_dashboard", os.path.join(os.path.dirname(__file__), "html-dashboard.py"))
+dashboard = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(dashboard)
+
+
+class FakeAgent(dashboard.Handler):
+    # Serves `state` the way an agent does: JSON with a weak ETag per version
+    state = None
+
+    def do_GET(self):
+        state = self.state
+        state["requests"].append((self.path, self.client_address[1], self.headers.get("If-None-Match")))
+        tag = f'W/"{state["version"]}"'
+        if state["status"] != 200:
+            body, code = b"", state["status"]
+        elif self.headers.get("If-None-Match") == tag:
+            body, code = b"", 304
+        else:
+            body, code = json.dumps(state[self.path.strip("/")]).encode(), 200
+        self.send_response(code)
+        self.send_header("ETag", tag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def agents():
+    # Three in-process agents; returns their states, keyed by address
+    servers = {}
+    for n in range(3):
+        health = monitoring.compose_health({})
+        health["processes"] = [{"pid": 7, "name": f"node{n}", "memory_mb": 12.0}]
+        state = {"health": health, "ports": [{"protocol": "tcp", "ip": "0.0.0.0", "port": 22, "scope": "All Interfaces",
+                                              "pid": 1, "process": "sshd"}],
+                 "version": 1, "status": 200, "requests": []}
+        state["handler"] = handler = type("Agent", (FakeAgent,), {"state": state, "timeout": 5})
+        server = dashboard.PooledHTTPServer(("127.0.0.1", 0), handler, workers=2, queue=4)
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers[server] = state
+    yield {f"127.0.0.1:{server.server_address[1]}": state for server, state in servers.items()}
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_poll(agents):
+    for address, state in agents.items():
+        agent = fleet.Agent(address, timeout=2)
+        assert agent.poll()
+        assert agent.error is None and agent.ports[0]["process"] == "sshd"
+        assert agent.health["processes"][0]["name"] == state["health"]["processes"][0]["name"]
+        assert agent.summary()["ok"] and agent.summary()["listeners"] == 1
+
+
+def test_unchanged_versions_reuse_the_last_result(agents):
+    address, state = next(iter(agents.items()))
+    agent = fleet.Agent(address, timeout=2)
+    agent.poll()
+    health = agent.health
+    assert not agent.poll()
+    assert agent.health is health
+    assert [r[2] for r in state["requests"]] == [None, None, 'W/"1"', 'W/"1"']
+    # One keep-alive connection for all of it
+    assert len({r[1] for r in state["requests"]}) == 1
+
+    state["version"] = 2
+    state["ports"] = []
+    assert agent.poll()
+    assert agent.ports == []
+
+
+def test_failures_keep_the_last_good_result(agents):
+    address, state = next(iter(agents.items()))
+    agent = fleet.Agent(address, timeout=2)
+    agent.poll()
+    state["status"] = 500
+    assert agent.poll()
+    assert "500" in agent.error
+    assert agent.health["processes"][0]["name"] == "node0"
+    assert not agent.summary()["ok"]
+
+    # A document that isn't a health report counts as a failure too
+    state["status"] = 200
+    state["version"] = 2
+    state["health"] = ["not", "a", "report"]
+    assert agent.poll()
+    assert agent.error and agent.health["processes"][0]["name"] == "node0"
+
+
+def test_stale_keep_alive_is_retried(agents):
+    address, state = next(iter(agents.items()))
+    # The agent drops idle keep-alive connections between polls
+    state["handler"].timeout = 0.2
+    agent = fleet.Agent(address, timeout=2)
+    agent.poll()
+    conn = agent.conn
+    time.sleep(0.5)
+    assert not agent.poll()
+    assert agent.error is None
+    assert agent.conn is not conn
+    assert len({r[1] for r in state["requests"]}) == 2
+
+
+def test_sparse_reports_still_render(agents):
+    # An older agent, or one on another platform, leaves parts out
+    address, state = next(iter(agents.items()))
+    state["health"] = {"status": "Online", "system": {"load": "high", "cores": [1.0, "x"]},
+                       "processes": [{"pid": 1, "name": "init", "memory_mb": 1.0}, {"pid": 2}, "junk"]}
+    state["ports"] = [{"protocol": "tcp", "ip": "::", "port": 80, "scope": "All Interfaces"}, {"port": "80"}]
+    agent = fleet.Agent(address, timeout=2)
+    assert agent.poll() and agent.error is None
+    assert [p["pid"] for p in agent.health["processes"]] == [1]
+    assert agent.health["system"]["cores"] == [1.0] and agent.health["system"]["load"] is None
+    assert agent.ports == [{"protocol": "tcp", "ip": "::", "port": 80, "scope": "All Interfaces", "pid": None, "process": None}]
+    fragments = dashboard.render_fragments(agent.health, agent.ports)
+    assert "init" in fragments["proc-rows"] and "Online" in fragments["status"]
+    # What a current agent sends passes through unchanged
+    health = monitoring.compose_health({})
+    assert fleet.conform(health, [])[0] == health
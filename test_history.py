@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from history import History, parse_range
+from store import Store
+
+
+def test_reboot_across_monitor_restart(tmp_path):
+    boot = int(time.time()) - 7200
+    store = Store(str(tmp_path))
+    history = History()
+    history.attach_store(store)
+    # Monitor runs for the first minute after boot
+    for ts in range(boot + 100, boot + 160, 5):
+        history.record("uptime_seconds", ts - boot, ts)
+    assert list(history.reboots) == []
+    store.close()
+
+    # Host rebooted at boot + 500; a new monitor starts from the store.
+    # Uptime is already past the last stored one, only the boot time moved.
+    store = Store(str(tmp_path))
+    history = History()
+    history.attach_store(store)
+    history.record("uptime_seconds", 400, boot + 900)
+    assert list(history.reboots) == [boot + 500]
+    store.close()
+
+    # A third run replays the reboot from the stored uptimes, and a plain
+    # monitor restart on the same boot is not a reboot
+    store = Store(str(tmp_path))
+    history = History()
+    history.attach_store(store)
+    history.record("uptime_seconds", 700, boot + 1200)
+    assert list(history.reboots) == [boot + 500]
+    store.close()
+
+
+def test_uptime_going_backwards_is_a_reboot():
+    history = History()
+    history.record("uptime_seconds", 5000, 10_000)
+    history.record("uptime_seconds", 5005, 10_005)
+    assert list(history.reboots) == []
+    history.record("uptime_seconds", 30, 10_100)
+    assert list(history.reboots) == [10_070]
+
+
+def test_clock_step_within_a_run_is_not_a_reboot():
+    history = History()
+    history.record("uptime_seconds", 30, 1_000_030)
+    # NTP moves the clock a day forward
+    history.record("uptime_seconds", 35, 1_086_435)
+    assert list(history.reboots) == []
+
+
+def test_parse_range():
+    assert parse_range("90s") == 90
+    assert parse_range("15m") == 900
+    assert parse_range("7d") == 7 * 86400
+    assert parse_range("3600") == 3600
+    for bad in ("1e999s", "infs", "nanm", "inf", "9" * 400, "abc", ""):
+        with pytest.raises(ValueError):
+            parse_range(bad)
@@ -0,0 +1,85 @@
+import re
+
+import metrics
+import monitoring
+
+HOSTILE = 'evil"} 1\nfake_metric{x="y"} 2\\'
+
+NAME = r"[a-zA-Z_:][a-zA-Z0-9_:]*"
+LABEL = rf'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\\n]|\\[\\"n])*)"'
+SAMPLE = re.compile(rf"({NAME})(?:\{{((?:{LABEL})(?:,{LABEL})*)\}})? (\S+)")
+
+
+def unescape(value):
+    return re.sub(r"\\(.)", lambda m: "\n" if m.group(1) == "n" else m.group(1), value)
+
+
+def parse(text):
+    # Strict reading of the text exposition format -> {family: (type, [(labels, value)])}
+    assert text.endswith("\n")
+    families = {}
+    current = None
+    for line in text[:-1].split("\n"):
+        if line.startswith("# HELP "):
+            name = line.split(" ")[2]
+            assert name not in families, f"second HELP for {name}"
+            families[name] = [None, []]
+            current = name
+        elif line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert name == current and families[name][0] is None and not families[name][1]
+            assert kind in ("gauge", "counter")
+            families[name][0] = kind
+        else:
+            match = SAMPLE.fullmatch(line)
+            assert match, f"not a sample line: {line!r}"
+            assert match.group(1) == current, f"{match.group(1)} outside its family"
+            labels = dict((k, unescape(v)) for k, v in re.findall(LABEL, match.group(2) or ""))
+            families[current][1].append((labels, float(match.group(len(match.groups())))))
+    return {name: (kind, samples) for name, (kind, samples) in families.items()}
+
+
+def health():
+    health = monitoring.compose_health({})
+    health["uptime_seconds"] = 3600.5
+    health["resolvers"] = [{"server": "1.1.1.1", "name": HOSTILE, "ok": True, "ms": 12.0},
+                           {"server": "8.8.8.8", "name": "example.com", "ok": False, "ms": None}]
+    health["processes"] = [{"pid": "7", "name": HOSTILE, "memory_mb": 2.0, "cpu_percent": 1.5}]
+    health["cpu_processes"] = health["processes"]
+    health["interfaces"] = [{"name": "eth0", "rx_bytes": 10, "tx_bytes": 20, "rx_bps": None, "tx_bps": None}]
+    health["system"] = dict(health["system"], cpu_percent=None, cores=[12.5, None], load=[0.5, 0.25, 0.1])
+    return health
+
+
+def test_output_parses():
+    ports = [{"protocol": "tcp", "scope": "LAN"}, {"protocol": "tcp", "scope": "LAN"}, {"protocol": "udp", "scope": HOSTILE}]
+    families = parse(metrics.render(health(), ports))
+    assert set(families) <= set(metrics.HELP)
+    assert families["pi5_network_receive_bytes_total"][0] == "counter"
+    assert families["pi5_uptime_seconds"][1] == [({}, 3600.5)]
+
+    # Hostile names come back intact as label values, and nothing leaks out
+    # as a sample of its own
+    assert "fake_metric" not in families
+    assert families["pi5_process_resident_bytes"][1] == [({"pid": "7", "name": HOSTILE}, 2 * 1024 * 1024)]
+    assert families["pi5_dns_resolve_seconds"][1] == [({"server": "1.1.1.1", "name": HOSTILE}, 0.012)]
+    assert families["pi5_listeners"][1] == [({"protocol": "tcp", "scope": "LAN"}, 2),
+                                            ({"protocol": "udp", "scope": HOSTILE}, 1)]
+
+
+def test_none_values_have_no_samples():
+    families = parse(metrics.render(health(), []))
+    # Unknown total CPU and the second core's first sample are left out
+    assert families["pi5_cpu_usage_percent"][1] == [({"cpu": "0"}, 12.5)]
+    assert families["pi5_ping_rtt_seconds"][1] == []
+    assert "pi5_memory_total_bytes" not in families
+    assert families["pi5_listeners"][1] == []
+
+
+def test_before_the_first_scans():
+    assert metrics.render(None, None) == ""
+    # Ports are scanned less often than the rest
+    families = parse(metrics.render(monitoring.compose_health({}), None))
+    assert "pi5_listeners" not in families
+    assert families["pi5_uptime_seconds"][1] == []
+    assert families["pi5_network_up"][1] == [({}, 0)]
@@ -0,0 +1,212 @@
+import os
+import socket
+import struct
+import sys
+
+import pytest
+
+import monitoring_linux as ml
+import util
+
+
+def hex_address(ip, port):
+    # As the kernel prints it: each 32-bit word of the address in host
+    # byte order, then the port
+    family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+    packed = socket.inet_pton(family, ip)
+    words = struct.unpack(f"={len(packed) // 4}I", packed)
+    return "".join(f"{w:08X}" for w in words) + f":{port:04X}"
+
+
+def raw_line(n, local, remote, state, inode=0):
+    return (f"{n:4}: {local} {remote} {state} 00000000:00000000 00:00000000 "
+            f"00000000 0 0 {inode} 1 0000000000000000 100 0 0 10 0\n")
+
+
+def net_line(n, local, remote, state, inode):
+    return raw_line(n, hex_address(*local), hex_address(*remote), state, inode)
+
+
+def write_net(proc, name, lines):
+    os.makedirs(os.path.join(proc, "net"), exist_ok=True)
+    with open(os.path.join(proc, "net", name), "w") as f:
+        f.write("  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n")
+        f.writelines(lines)
+
+
+def write_process(proc, pid, comm, start, inodes):
+    fields = ["S"] + ["0"] * 40
+    fields[19] = str(start)
+    os.makedirs(os.path.join(proc, str(pid), "fd"), exist_ok=True)
+    with open(os.path.join(proc, str(pid), "stat"), "w") as f:
+        f.write(f"{pid} ({comm}) {' '.join(fields)}\n")
+    fd_dir = os.path.join(proc, str(pid), "fd")
+    for fd in os.listdir(fd_dir):
+        os.remove(os.path.join(fd_dir, fd))
+    for fd, inode in enumerate(inodes, 3):
+        os.symlink(f"socket:[{inode}]", os.path.join(fd_dir, str(fd)))
+
+
+@pytest.fixture
+def proc(tmp_path, monkeypatch):
+    # Fake procfs and an empty socket index
+    monkeypatch.setattr(ml, "PROC_ROOT", str(tmp_path))
+    monkeypatch.setattr(ml, "_pid_inodes", {})
+    monkeypatch.setattr(ml, "_inode_pids", {})
+    monkeypatch.setattr(ml, "_pid_start", {})
+    monkeypatch.setattr(ml, "_last_full_scan", 0)
+    return str(tmp_path)
+
+
+def owners():
+    return [(p["port"], p["pid"], p["process"]) for p in ml.get_listening_ports()]
+
+
+def test_exec_and_reused_pid_show_the_current_owner(proc):
+    write_net(proc, "tcp", [net_line(0, ("0.0.0.0", 8000), ("0.0.0.0", 0), "0A", 501)])
+    write_process(proc, 40, "sh", 100, [501])
+    assert owners() == [(8000, 40, "sh")]
+
+    # sh -c "...; exec python3 -m http.server": same PID, start time and socket
+    write_process(proc, 40, "python3", 100, [501])
+    assert owners() == [(8000, 40, "python3")]
+
+    # The PID is reused by a process that does not hold the socket; the
+    # real owner is found again
+    write_process(proc, 40, "cron", 900, [])
+    write_process(proc, 41, "python3", 100, [501])
+    assert owners() == [(8000, 41, "python3")]
+
+    # The PID comes back as a new listener owner, picked up by the next
+    # full rescan like any known process opening a listener
+    ml._last_full_scan = 0
+    write_net(proc, "tcp", [net_line(0, ("0.0.0.0", 8000), ("0.0.0.0", 0), "0A", 501),
+                            net_line(1, ("0.0.0.0", 9000), ("0.0.0.0", 0), "0A", 777)])
+    write_process(proc, 40, "nginx", 950, [777])
+    assert owners() == [(8000, 41, "python3"), (9000, 40, "nginx")]
+
+
+def test_owner_gone(proc):
+    write_net(proc, "tcp", [net_line(0, ("0.0.0.0", 22), ("0.0.0.0", 0), "0A", 601)])
+    write_process(proc, 7, "sshd", 5, [601])
+    assert owners() == [(22, 7, "sshd")]
+    os.remove(os.path.join(proc, "7", "stat"))
+    assert owners() == [(22, None, None)]
+
+
+def listeners():
+    return [(p["protocol"], p["family"], p["ip"], p["port"]) for p in ml.get_listening_ports()]
+
+
+@pytest.mark.skipif(sys.byteorder != "little", reason="lines as a little-endian kernel prints them")
+def test_addresses_as_a_little_endian_kernel_prints_them(proc):
+    any4, any6 = "00000000:0000", "00000000000000000000000000000000:0000"
+    write_net(proc, "tcp", [
+        raw_line(0, "0100007F:0277", any4, "0A"),
+        raw_line(1, "0101A8C0:0016", "6401A8C0:D431", "01"),
+    ])
+    write_net(proc, "tcp6", [
+        raw_line(0, "0000000000000000FFFF00000100007F:0035", any6, "0A"),
+        raw_line(1, "B80D0120000000000000000001000000:01BB", any6, "0A"),
+    ])
+    write_net(proc, "udp", [raw_line(0, "3500007F:0035", any4, "07")])
+    write_net(proc, "udp6", [raw_line(0, "00000000000000000000000001000000:0202", any6, "07")])
+    assert listeners() == [
+        ("tcp", "ipv6", "::ffff:127.0.0.1", 53),
+        ("udp", "ipv4", "127.0.0.53", 53),
+        ("tcp", "ipv6", "2001:db8::1", 443),
+        ("udp", "ipv6", "::1", 514),
+        ("tcp", "ipv4", "127.0.0.1", 631),
+    ]
+
+
+def test_listen_states_per_protocol(proc):
+    any4 = ("0.0.0.0", 0)
+    write_net(proc, "tcp", [
+        net_line(0, ("0.0.0.0", 22), any4, "0A", 1),
+        net_line(1, ("0.0.0.0", 23), any4, "07", 2),      # TCP_CLOSE
+        net_line(2, ("10.0.0.2", 40000), ("10.0.0.1", 22), "01", 3),
+    ])
+    write_net(proc, "udp", [
+        net_line(0, ("0.0.0.0", 68), any4, "07", 4),       # unconnected: bound and waiting
+        net_line(1, ("10.0.0.2", 41000), ("10.0.0.1", 53), "01", 5),
+        net_line(2, ("0.0.0.0", 69), any4, "0A", 6),
+    ])
+    write_net(proc, "tcp6", [net_line(0, ("fe80::1", 8080), ("::", 0), "0A", 7)])
+    write_net(proc, "udp6", [net_line(0, ("2001:db8::5", 5353), ("::", 0), "07", 8)])
+    assert listeners() == [
+        ("tcp", "ipv4", "0.0.0.0", 22),
+        ("udp", "ipv4", "0.0.0.0", 68),
+        ("udp", "ipv6", "2001:db8::5", 5353),
+        ("tcp", "ipv6", "fe80::1", 8080),
+    ]
+
+
+def test_missing_ipv6_tables(proc):
+    # Kernels with IPv6 disabled have no tcp6/udp6
+    write_net(proc, "tcp", [net_line(0, ("127.0.0.1", 5432), ("0.0.0.0", 0), "0A", 1)])
+    write_net(proc, "udp", [])
+    assert listeners() == [("tcp", "ipv4", "127.0.0.1", 5432)]
+    assert [p["scope"] for p in ml.get_listening_ports()] == ["Localhost"]
+
+
+def test_connections(proc):
+    any4 = ("0.0.0.0", 0)
+    write_net(proc, "tcp", [
+        net_line(0, ("0.0.0.0", 22), any4, "0A", 1),
+        net_line(1, ("10.0.0.2", 22), ("10.0.0.9", 50001), "01", 2),
+        net_line(2, ("10.0.0.2", 22), ("10.0.0.9", 50002), "01", 3),
+        net_line(3, ("10.0.0.2", 22), ("10.0.0.7", 50003), "01", 4),
+        # Outgoing: the local port is ephemeral and not a listener
+        net_line(4, ("10.0.0.2", 41000), ("10.0.0.1", 443), "01", 5),
+        net_line(5, ("10.0.0.2", 41001), ("10.0.0.1", 443), "06", 6),
+    ])
+    write_net(proc, "tcp6", [
+        net_line(0, ("::", 8080), ("::", 0), "0A", 7),
+        net_line(1, ("2001:db8::2", 8080), ("2001:db8::9", 50004), "01", 8),
+        net_line(2, ("::ffff:10.0.0.2", 8080), ("::ffff:10.0.0.9", 50005), "08", 9),
+    ])
+    connections = ml.get_connections()
+    assert connections["established"] == 5
+    assert connections["states"] == {"listen": 2, "established": 5, "time_wait": 1, "close_wait": 1}
+    assert connections["by_port"] == [{"port": 22, "connections": 3}, {"port": 8080, "connections": 1}]
+    assert connections["top_peers"][:2] == [{"ip": "10.0.0.9", "connections": 2}, {"ip": "10.0.0.7", "connections": 1}]
+    assert {p["ip"] for p in connections["top_peers"]} == {"10.0.0.9", "10.0.0.7", "10.0.0.1", "2001:db8::9"}
+    assert ml.get_connections(limit=1)["by_port"] == [{"port": 22, "connections": 3}]
+
+
+def write_dev(proc, counters):
+    with open(os.path.join(proc, "net", "dev"), "w") as f:
+        f.write("Inter-|   Receive                                                |  Transmit\n"
+                " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed\n")
+        for name, (rx, rx_packets, tx, tx_packets) in counters.items():
+            f.write(f"{name:>6}: {rx} {rx_packets} 0 0 0 0 0 0 {tx} {tx_packets} 0 0 0 0 0 0\n")
+
+
+def test_interface_rates(proc, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(util, "time", type("Clock", (), {"monotonic": staticmethod(lambda: clock[0])}))
+    monkeypatch.setattr(util, "_last_interfaces", (None, {}))
+    os.makedirs(os.path.join(proc, "net"))
+
+    write_dev(proc, {"lo": (9, 9, 9, 9), "eth0": (1000, 10, 500, 5)})
+    first = ml.get_interfaces()
+    assert [i["name"] for i in first] == ["eth0"]
+    assert first[0]["rx_bytes"] == 1000 and first[0]["rx_bps"] is None and first[0]["tx_pps"] is None
+
+    clock[0] = 102.0
+    write_dev(proc, {"eth0": (3000, 30, 900, 7), "wlan0": (50, 1, 50, 1)})
+    eth0, wlan0 = ml.get_interfaces()
+    assert (eth0["rx_bps"], eth0["rx_pps"], eth0["tx_bps"], eth0["tx_pps"]) == (1000.0, 10.0, 200.0, 1.0)
+    # New since the last call: no rate yet
+    assert wlan0["rx_bps"] is None
+
+    # eth0 was recreated and its counters started over
+    clock[0] = 104.0
+    write_dev(proc, {"eth0": (100, 1, 900, 9), "wlan0": (150, 3, 50, 1)})
+    eth0, wlan0 = ml.get_interfaces()
+    assert (eth0["rx_bps"], eth0["rx_pps"], eth0["tx_bps"], eth0["tx_pps"]) == (0.0, 0.0, 0.0, 1.0)
+    assert wlan0["rx_bps"] == 50.0
+
+    # No time has passed
+    assert util.interface_rates({"eth0": (200, 2, 900, 9)})[0]["rx_bps"] is None
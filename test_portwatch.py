@@ -0,0 +1,82 @@
+from portwatch import PortWatch
+
+
+def listener(port, scope="public", protocol="tcp", ip="0.0.0.0"):
+    return {"protocol": protocol, "ip": ip, "port": port, "scope": scope, "pid": 1, "process": "x"}
+
+
+def kinds(result):
+    return [(e["id"], e["event"], e["port"]) for e in result["events"]]
+
+
+def test_first_snapshot_is_the_baseline():
+    watch = PortWatch()
+    watch.record("ports", [listener(22), listener(80)], ts=100)
+    result = watch.since()
+    assert result == {"cursor": 0, "reset": False, "truncated": False, "events": []}
+
+
+def test_opened_and_closed():
+    watch = PortWatch()
+    watch.record("ports", [listener(22)], ts=100)
+    watch.record("ports", [listener(22), listener(8080), listener(53, protocol="udp")], ts=110)
+    watch.record("ports", [listener(53, protocol="udp"), listener(8080)], ts=120)
+    watch.record("system", [], ts=130)
+
+    result = watch.since()
+    assert kinds(result) == [(1, "opened", 8080), (2, "opened", 53), (3, "closed", 22)]
+    assert result["cursor"] == 3
+    assert [e["time"] for e in result["events"]] == [110, 110, 120]
+
+    # Polling with the returned cursor only yields newer events
+    assert watch.since(3)["events"] == []
+    assert kinds(watch.since(2)) == [(3, "closed", 22)]
+
+
+def test_scope_filter():
+    watch = PortWatch()
+    watch.record("ports", [], ts=100)
+    watch.record("ports", [listener(22), listener(631, scope="local", ip="127.0.0.1")], ts=110)
+    assert kinds(watch.since(scope="local")) == [(2, "opened", 631)]
+    assert kinds(watch.since(scope="public")) == [(1, "opened", 22)]
+    assert watch.since(scope="local")["cursor"] == 2
+
+
+def test_dropped_events_are_flagged():
+    watch = PortWatch(keep=2)
+    watch.record("ports", [], ts=100)
+    for port in (1, 2, 3, 4):
+        watch.record("ports", [listener(port)], ts=100 + port)
+    # Events 1..7 happened, only 6 and 7 are kept
+    result = watch.since(2)
+    assert result["truncated"] and not result["reset"]
+    assert kinds(result) == [(6, "opened", 4), (7, "closed", 3)]
+    assert not watch.since(5)["truncated"]
+
+
+def test_cursor_from_an_earlier_run():
+    watch = PortWatch()
+    watch.record("ports", [], ts=100)
+    watch.record("ports", [listener(22)], ts=110)
+    # A client still holds cursor 40 from before a restart without --data-dir
+    result = watch.since(40)
+    assert result["reset"] and result["truncated"]
+    assert result["cursor"] == 1
+    assert kinds(result) == [(1, "opened", 22)]
+
+
+def test_log_restores_the_sequence(tmp_path):
+    path = str(tmp_path / "ports.log")
+    watch = PortWatch()
+    watch.attach_log(path)
+    watch.record("ports", [], ts=100)
+    watch.record("ports", [listener(22)], ts=110)
+    with open(path, "a") as f:
+        f.write('{"id": 2, "ev')
+
+    restarted = PortWatch()
+    restarted.attach_log(path)
+    assert not restarted.since(1)["reset"]
+    restarted.record("ports", [listener(22)], ts=120)
+    restarted.record("ports", [], ts=130)
+    assert kinds(restarted.since(1)) == [(2, "closed", 22)]
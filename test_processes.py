@@ -0,0 +1,68 @@
+import os
+from array import array
+
+import pytest
+
+import monitoring_linux as ml
+
+
+def write_stat(proc, pid, comm, ticks=0, start=100, rss=0):
+    # /proc/<pid>/stat: fields after "(comm) " start at the state, utime is
+    # 11, stime 12, starttime 19 and rss 21
+    fields = ["S"] + ["0"] * 40
+    fields[11] = str(ticks)
+    fields[19] = str(start)
+    fields[21] = str(rss)
+    os.makedirs(os.path.join(proc, str(pid)), exist_ok=True)
+    with open(os.path.join(proc, str(pid), "stat"), "w") as f:
+        f.write(f"{pid} ({comm}) {' '.join(fields)}\n")
+
+
+@pytest.fixture
+def proc(tmp_path, monkeypatch):
+    # Fake procfs and a fresh CPU sample state
+    monkeypatch.setattr(ml, "PROC_ROOT", str(tmp_path))
+    monkeypatch.setattr(ml, "_cpu_pids", array("i"))
+    monkeypatch.setattr(ml, "_cpu_starts", array("Q"))
+    monkeypatch.setattr(ml, "_cpu_ticks", array("Q"))
+    monkeypatch.setattr(ml, "_cpu_time", 0)
+    monkeypatch.setattr(ml, "_scan_time", -ml.SCAN_MAX_AGE)
+    monkeypatch.setattr(ml, "_scan_rows", [])
+    return str(tmp_path)
+
+
+def rescan(seconds=1.0):
+    # Pretend `seconds` passed since the last scan
+    ml._cpu_time -= seconds
+    ml._scan_time = -ml.SCAN_MAX_AGE
+
+
+def test_kernel_threads_rank_by_cpu_not_memory(proc):
+    write_stat(proc, 1, "init", ticks=100, rss=1000)
+    write_stat(proc, 12, "ksoftirqd/0", ticks=0, rss=0)
+    write_stat(proc, 300, "python3", ticks=100, rss=5000)
+    ml.get_top_cpu_processes()
+
+    write_stat(proc, 12, "ksoftirqd/0", ticks=ml.CLK_TCK // 2, rss=0)
+    rescan()
+    cpu = ml.get_top_cpu_processes(limit=2)
+    assert cpu[0]["name"] == "ksoftirqd/0"
+    assert 45 <= cpu[0]["cpu_percent"] <= 55
+    memory = ml.get_top_processes(limit=5)
+    assert [p["name"] for p in memory] == ["python3", "init"]
+
+
+def test_reused_pid_and_exec_show_the_current_name(proc):
+    write_stat(proc, 400, "sh", start=100, rss=100)
+    assert [p["name"] for p in ml.get_top_processes()] == ["sh"]
+
+    # sh -c "exec app": same PID and start time, new name
+    write_stat(proc, 400, "app", start=100, rss=200)
+    rescan()
+    assert [p["name"] for p in ml.get_top_processes()] == ["app"]
+
+    # PID reused by an unrelated process
+    write_stat(proc, 400, "cron", start=900, ticks=500, rss=50)
+    rescan()
+    assert ml.get_top_processes() == [{"pid": "400", "name": "cron", "memory_mb": round(50 * ml.PAGE_SIZE / 1024 / 1024, 1),
+                                       "cpu_percent": 0.0}]
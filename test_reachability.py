@@ -0,0 +1,45 @@
+import socket
+
+import pytest
+
+import reachability
+
+
+@pytest.fixture
+def refused_port():
+    # Bound but not listening: connections are refused, which still proves
+    # the host is up
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    yield sock.getsockname()[1]
+    sock.close()
+
+
+def test_tcp_fallback_when_icmp_is_dropped(monkeypatch, refused_port):
+    monkeypatch.setattr(reachability, "_icmp_socket", lambda: socket.socket(socket.AF_INET, socket.SOCK_DGRAM))
+    monkeypatch.setattr(reachability, "_icmp_probe", lambda sock, hosts, count, timeout: {h: [] for h in hosts})
+    result = reachability.probe([("127.0.0.1", refused_port)], count=2, timeout=0.5)
+    assert result["reachable"]
+    assert result["method"] == "tcp"
+    assert result["target"] == f"127.0.0.1:{refused_port}"
+    assert result["received"] == 2 and result["loss"] == 0
+
+
+def test_tcp_when_icmp_sockets_are_not_allowed(monkeypatch, refused_port):
+    monkeypatch.setattr(reachability, "_icmp_socket", lambda: None)
+    result = reachability.probe([("127.0.0.1", refused_port)], count=1, timeout=0.5)
+    assert result["reachable"] and result["method"] == "tcp"
+
+
+def test_icmp_replies_skip_the_fallback(monkeypatch):
+    monkeypatch.setattr(reachability, "_icmp_socket", lambda: socket.socket(socket.AF_INET, socket.SOCK_DGRAM))
+    monkeypatch.setattr(reachability, "_icmp_probe", lambda sock, hosts, count, timeout: {h: [0.01] for h in hosts})
+    monkeypatch.setattr(reachability, "_tcp_probe", lambda *args: pytest.fail("TCP fallback used"))
+    result = reachability.probe([("192.0.2.1", 53)], count=1, timeout=0.5)
+    assert result == {"reachable": True, "method": "icmp", "target": "192.0.2.1", "sent": 1, "received": 1,
+                      "loss": 0.0, "rtt_ms": 10.0}
+
+
+def test_checksum():
+    # RFC 1071 example
+    assert reachability._checksum(bytes.fromhex("0001f203f4f5f6f7")) == 0x220d
@@ -0,0 +1,28 @@
+import monitoring
+import registry
+
+PROBE_NAMES = {"ports", "processes", "cpu_processes", "system", "connections", "interfaces",
+               "uptime_seconds", "ping", "resolvers"}
+
+
+def test_every_platform_gets_the_full_probe_set():
+    for platform in ("linux", "darwin"):
+        probes = registry.available(platform)
+        assert set(probes) == PROBE_NAMES, platform
+        for probe in probes.values():
+            assert probe.supported(platform)
+
+
+def test_backends_keep_their_own_probes():
+    assert registry.available("darwin")["ports"].func is monitoring.monitoring_darwin.get_listening_ports
+    assert registry.available("linux")["ports"].func is monitoring.monitoring_linux.get_listening_ports
+
+
+def test_compose_health_from_defaults(monkeypatch):
+    available = registry.available
+    for platform in ("linux", "darwin"):
+        monkeypatch.setattr(registry, "available", lambda platform=platform: available(platform))
+        health = monitoring.compose_health({})
+        assert "ports" not in health
+        assert health["status"] == "Offline"
+        assert health["uptime"] == "Unknown"
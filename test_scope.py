@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from util import classify_scope
+
+
+@pytest.mark.parametrize("ip, scope", [
+    ("0.0.0.0", "All Interfaces"),
+    ("::", "All Interfaces"),
+    ("127.0.0.1", "Localhost"),
+    ("127.53.0.1", "Localhost"),
+    ("::1", "Localhost"),
+    ("10.1.2.3", "LAN"),
+    ("172.16.0.1", "LAN"),
+    ("172.31.255.255", "LAN"),
+    ("172.32.0.1", "Public"),
+    ("192.168.1.10", "LAN"),
+    ("169.254.10.1", "Link-Local"),
+    ("fe80::1", "Link-Local"),
+    ("fe80::1%eth0", "Link-Local"),
+    ("100.64.0.1", "VPN"),
+    ("100.127.255.255", "VPN"),
+    ("100.128.0.1", "Public"),
+    ("8.8.8.8", "Public"),
+    ("2001:4860:4860::8888", "Public"),
+    ("not-an-ip", "Unknown"),
+    ("999.1.1.1", "Unknown"),
+])
+def test_builtin_scopes(ip, scope):
+    assert classify_scope(ip) == scope
+
+
+def test_longest_prefix_wins():
+    # Tailscale's /48 sits inside the ULA /7
+    assert classify_scope("fd7a:115c:a1e0::1") == "VPN"
+    assert classify_scope("fd7a:115c:a1e1::1") == "ULA"
+    assert classify_scope("fc00::1") == "ULA"
+
+
+def test_ipv4_mapped_addresses_classify_as_ipv4():
+    assert classify_scope("::ffff:127.0.0.1") == "Localhost"
+    assert classify_scope("::ffff:192.168.1.5") == "LAN"
+    assert classify_scope("::ffff:0.0.0.0") == "All Interfaces"
+    assert classify_scope("::ffff:8.8.8.8") == "Public"
+
+
+def test_scope_networks_from_the_environment():
+    # Read at import, so checked in a fresh interpreter
+    code = ("from util import classify_scope as c; "
+            "print(c('192.168.50.7'), c('192.168.51.7'), c('203.0.113.9'), c('::ffff:203.0.113.9'))")
+    env = dict(os.environ, SCOPE_NETWORKS="192.168.50.0/24=Lab, 203.0.113.0/24 = DMZ,bogus")
+    out = subprocess.run([sys.executable, "-c", code], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                         capture_output=True, text=True, check=True).stdout
+    assert out.split() == ["Lab", "LAN", "DMZ", "DMZ"]
@@ -0,0 +1,127 @@
+import os
+import time
+
+import store
+from history import History
+from store import RECORD, Store
+
+
+def test_append_flush_query(tmp_path):
+    s = Store(str(tmp_path))
+    now = int(time.time())
+    for i in range(10):
+        s.append("cpu", float(i), now + i)
+        s.append("load", float(i) / 10, now + i)
+    # Half on disk, half still pending: queries see both
+    s.flush()
+    s.append("cpu", 10.0, now + 10)
+    assert s.query("cpu", now + 8, now + 100) == [[now + 8, 8.0], [now + 9, 9.0], [now + 10, 10.0]]
+    assert s.query("nope", now, now + 100) == []
+    records = list(s.scan(now, now + 100))
+    assert [r[0] for r in records] == sorted(r[0] for r in records)
+    assert len(records) == 21
+    s.close()
+
+    s = Store(str(tmp_path))
+    assert len(s.query("cpu", now, now + 100)) == 11
+    assert sorted(s.metrics()) == ["cpu", "load"]
+
+
+def test_torn_record_is_truncated(tmp_path):
+    s = Store(str(tmp_path))
+    now = int(time.time())
+    for i in range(5):
+        s.append("cpu", float(i), now + i)
+    s.close()
+    segment, = [os.path.join(str(tmp_path), f) for f in os.listdir(str(tmp_path)) if f.startswith("seg-")]
+    with open(segment, "ab") as f:
+        f.write(b"\x01\x02\x03\x04\x05")
+
+    s = Store(str(tmp_path))
+    assert os.path.getsize(segment) == 5 * RECORD.size
+    assert [v for ts, v in s.query("cpu", now, now + 10)] == [0.0, 1.0, 2.0, 3.0, 4.0]
+    # Appends carry on after the last whole record
+    s.append("cpu", 5.0, now + 5)
+    s.close()
+    assert os.path.getsize(segment) == 6 * RECORD.size
+
+
+def test_retention_by_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, "SEGMENT_BYTES", 10 * RECORD.size)
+    monkeypatch.setattr(store, "RETENTION_BYTES", 25 * RECORD.size)
+    s = Store(str(tmp_path))
+    now = int(time.time()) - 1000
+    for i in range(100):
+        s.append("cpu", float(i), now + i)
+        if i % 10 == 9:
+            s.flush()
+    segments = [f for f in os.listdir(str(tmp_path)) if f.startswith("seg-")]
+    assert sum(os.path.getsize(os.path.join(str(tmp_path), f)) for f in segments) <= 30 * RECORD.size
+    points = s.query("cpu", now, now + 1000)
+    assert points[-1] == [now + 99, 99.0]
+    assert points[0][0] >= now + 70
+
+
+def test_retention_by_age(tmp_path, monkeypatch):
+    # A segment goes once the one after it also starts before the cutoff,
+    # i.e. once all of its records are too old
+    monkeypatch.setattr(store, "SEGMENT_BYTES", 10 * RECORD.size)
+    s = Store(str(tmp_path))
+    old = int(time.time()) - store.RETENTION_SECONDS - 3600
+    now = int(time.time())
+    for first in (old, old + 100, now):
+        for i in range(10):
+            s.append("cpu", 1.0, first + i)
+        s.flush()
+    s.append("cpu", 1.0, now + 10)
+    s.flush()
+    assert s.query("cpu", old, old + 99) == []
+    assert len(s.query("cpu", old + 100, old + 200)) == 10
+    assert len(s.query("cpu", now, now + 100)) == 11
+
+
+def test_clock_stepping_back(tmp_path):
+    s = Store(str(tmp_path))
+    now = int(time.time())
+    for i in range(5):
+        s.append("cpu", float(i), now + i)
+    s.flush()
+    # The clock goes back a minute: those samples are held at the newest time
+    for i in range(5, 8):
+        s.append("cpu", float(i), now - 60 + i)
+    s.flush()
+    assert s.query("cpu", now + 4, now + 4) == [[now + 4, 4.0], [now + 4, 5.0], [now + 4, 6.0], [now + 4, 7.0]]
+    assert s.query("cpu", now - 60, now + 3) == [[now + i, float(i)] for i in range(4)]
+    s.close()
+
+    # Also across a restart
+    s = Store(str(tmp_path))
+    s.append("cpu", 8.0, now - 3600)
+    s.append("cpu", 9.0, now + 10)
+    assert [v for ts, v in s.query("cpu", now + 4, now + 4)] == [4.0, 5.0, 6.0, 7.0, 8.0]
+    s.close()
+    records = list(s.scan(0, now + 100))
+    assert [r[0] for r in records] == sorted(r[0] for r in records)
+    assert len(records) == 10
+
+
+def test_history_replays_store_in_minute_averages(tmp_path):
+    s = Store(str(tmp_path))
+    start = (int(time.time()) // 3600 - 2) * 3600
+    for ts in range(start, start + 3600, 5):
+        s.append("cpu", 10.0 if (ts // 60) % 2 else 20.0, ts)
+    s.close()
+
+    history = History()
+    history.attach_store(Store(str(tmp_path)))
+    points = history.query("cpu", 3600, now=start + 3600)
+    # Raw tier comes straight from the store
+    assert points["tier"] == "raw" and len(points["points"]) == 720
+    ring = dict(history.metrics["cpu"].rings)["1m"]
+    minutes = ring.query(start, start + 3599)
+    assert len(minutes) == 60
+    assert {value for ts, value in minutes} == {10.0, 20.0}
+    # Each 15m slot averages its fifteen minutes, weighted by samples
+    ring = dict(history.metrics["cpu"].rings)["15m"]
+    expected = [round(sum(v for ts, v in minutes if q <= ts < q + 900) / 15, 3) for q in range(start, start + 3600, 900)]
+    assert [value for ts, value in ring.query(start, start + 3599)] == expected
@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from monitoring_linux import SystemStats
+
+
+def write(root, path, text):
+    path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def cpu_line(name, busy, idle, iowait=0):
+    # user nice system idle iowait irq softirq steal
+    return f"{name} {busy} 0 0 {idle} {iowait} 0 0 0 0 0\n"
+
+
+def disk_line(name, read, written, io_ms):
+    return f"   179       0 {name} 100 0 {read} 0 100 0 {written} 0 0 {io_ms} 0\n"
+
+
+@pytest.fixture
+def roots(tmp_path):
+    proc, sys = str(tmp_path / "proc"), str(tmp_path / "sys")
+    write(proc, "stat", cpu_line("cpu", 100, 900) + cpu_line("cpu0", 50, 450) + cpu_line("cpu1", 50, 450) +
+          "intr 12345\nctxt 999\n")
+    write(proc, "loadavg", "0.52 0.40 0.33 2/345 6789\n")
+    write(proc, "meminfo", "MemTotal:        4000000 kB\nMemFree:          500000 kB\n"
+                           "MemAvailable:    1000000 kB\nSwapTotal:        102400 kB\nSwapFree:          51200 kB\n")
+    write(proc, "diskstats", disk_line("mmcblk0", 1000, 2000, 100) + disk_line("mmcblk0p1", 500, 500, 50) +
+          disk_line("loop0", 9000, 0, 0) + disk_line("zram0", 0, 9000, 0))
+    for name in ("mmcblk0", "loop0", "zram0"):
+        os.makedirs(os.path.join(sys, "block", name))
+    write(sys, "class/thermal/thermal_zone0/type", "cpu-thermal\n")
+    write(sys, "class/thermal/thermal_zone0/temp", "52100\n")
+    write(sys, "class/thermal/thermal_zone1/temp", "40000\n")
+    return proc, sys
+
+
+def test_first_sample_has_no_rates(roots):
+    stats = SystemStats(*roots)
+    system = stats.sample()
+    assert system["cpu_percent"] is None and system["cores"] == [None, None]
+    assert system["disks"] == []
+    assert system["load"] == [0.52, 0.40, 0.33]
+    assert system["memory"] == {"total_mb": 3906.2, "available_mb": 976.6, "used_percent": 75.0, "swap_used_mb": 50.0}
+    # Zones without a type file fall back to the zone name
+    assert system["thermal"] == [{"zone": "cpu-thermal", "celsius": 52.1}, {"zone": "thermal_zone1", "celsius": 40.0}]
+    assert system["temperature"] == 52.1
+    stats.close()
+
+
+def test_cpu_and_disk_rates(roots):
+    proc, sys = roots
+    stats = SystemStats(proc, sys)
+    stats.sample()
+    # Over two seconds: core 0 fully busy, core 1 idle apart from iowait;
+    # the whole disk read 2 MiB and wrote 4 MiB while busy half the time
+    write(proc, "stat", cpu_line("cpu", 200, 900, 100) + cpu_line("cpu0", 150, 450) + cpu_line("cpu1", 50, 450, 100))
+    write(proc, "diskstats", disk_line("mmcblk0", 1000 + 2 * 2048, 2000 + 4 * 2048, 1100) +
+          disk_line("mmcblk0p1", 9999, 9999, 9999))
+    write(sys, "class/thermal/thermal_zone0/temp", "61000\n")
+    then, cpu, disks = stats.last
+    stats.last = (then - 2.0, cpu, disks)
+
+    system = stats.sample()
+    assert system["cpu_percent"] == 50.0
+    assert system["cores"] == [100.0, 0.0]
+    # Partitions and virtual devices are left out
+    disk, = system["disks"]
+    assert disk["name"] == "mmcblk0"
+    assert disk["read_bps"] == pytest.approx(1024 * 1024, rel=0.01)
+    assert disk["write_bps"] == pytest.approx(2 * 1024 * 1024, rel=0.01)
+    assert disk["util_percent"] == pytest.approx(50, abs=1)
+    # Files are re-read through the same descriptors
+    assert system["temperature"] == 61.0
+    stats.close()
+
+
+def test_missing_thermal_and_block(tmp_path, roots):
+    proc, sys = roots
+    stats = SystemStats(proc, str(tmp_path / "nosys"))
+    system = stats.sample()
+    assert system["temperature"] is None and system["thermal"] == []
+    stats.close()
@@ -0,0 +1,71 @@
+import json
+import math
+
+import pytest
+
+import wire
+
+INTS = [0, 1, 127, 128, 255, 256, 65535, 65536, 2 ** 32 - 1, 2 ** 32, 2 ** 64 - 1,
+        -1, -32, -33, -128, -129, -32768, -32769, -2 ** 31, -2 ** 31 - 1, -2 ** 63]
+
+
+@pytest.mark.parametrize("value", INTS + [
+    None, True, False, 0.0, -1.5, 1e300, "", "a", "x" * 31, "x" * 32, "x" * 255, "x" * 256, "x" * 65536,
+    "héllo ✓", [], [1] * 15, [1] * 16, [1] * 65536, {}, {str(i): i for i in range(15)},
+    {str(i): i for i in range(16)}, {str(i): i for i in range(65536)},
+    {"nested": [{"a": [None, True, 1.25]}, [], {}], "ports": [{"port": 22, "ip": "::"}]},
+])
+def test_round_trip(value):
+    assert wire.unpack(wire.pack(value)) == value
+
+
+def test_ints_use_the_smallest_form():
+    sizes = [len(wire.pack(v)) for v in INTS]
+    assert sizes == [1, 1, 1, 2, 2, 3, 3, 5, 5, 9, 9, 1, 1, 2, 2, 3, 3, 5, 5, 9, 9]
+
+
+def test_known_encodings():
+    # Byte-for-byte against the msgpack spec
+    assert wire.pack({"a": [1, -1, None, True]}) == b"\x81\xa1a\x94\x01\xff\xc0\xc3"
+    assert wire.pack(1.5) == b"\xcb\x3f\xf8\x00\x00\x00\x00\x00\x00"
+    assert wire.pack((1, 2)) == wire.pack([1, 2])
+    # float32 from other encoders
+    assert wire.unpack(b"\xca\x3f\xc0\x00\x00") == 1.5
+
+
+def test_nan_survives():
+    assert math.isnan(wire.unpack(wire.pack(float("nan"))))
+
+
+def test_json_shaped_api_data_matches_json():
+    data = {"status": "Online", "uptime_seconds": 12345.67, "processes": [{"pid": "1", "memory_mb": 12.5}],
+            "load": [0.1, 0.2, 0.3], "temperature": None}
+    assert wire.unpack(wire.pack(data)) == json.loads(json.dumps(data))
+
+
+def test_unsupported_types():
+    with pytest.raises(TypeError):
+        wire.pack(b"bytes")
+    with pytest.raises(TypeError):
+        wire.pack({1, 2})
+
+
+@pytest.mark.parametrize("data", [b"", b"\x92\x01", b"\xa5abc", b"\xcd\x01", b"\xc1", b"\xc4\x01a", b"\x01\x02",
+                                  b"\xa2\xff\xfe"])
+def test_corrupt_input_raises_value_error(data):
+    with pytest.raises(ValueError):
+        wire.unpack(data)
+
+
+def test_interoperates_with_msgpack():
+    msgpack = pytest.importorskip("msgpack")
+    data = {"a": [1, -40, 2 ** 40, -2 ** 40, 1.5, None, True, "ü" * 40], "b": {"c": list(range(20))}}
+    assert msgpack.unpackb(wire.pack(data)) == data
+    assert wire.unpack(msgpack.packb(data)) == data
+
+
+def test_truncated_string_in_a_container():
+    data = wire.pack(["abcdef", 1])
+    for cut in range(1, len(data)):
+        with pytest.raises(ValueError):
+            wire.unpack(data[:cut])
@@ -1,6 +1,105 @@
+import ipaddress
+import os
+import socket
+import time
+from functools import lru_cache
 
+
+# Built-in scopes; the longest matching prefix wins, so more specific
+# entries (like Tailscale's ULA range) override broader ones
+DEFAULT_NETWORKS = [
+    ("0.0.0.0/32", "All Interfaces"),
+    ("::/128", "All Interfaces"),
+    ("127.0.0.0/8", "Localhost"),
+    ("::1/128", "Localhost"),
+    ("10.0.0.0/8", "LAN"),
+    ("172.16.0.0/12", "LAN"),
+    ("192.168.0.0/16", "LAN"),
+    ("169.254.0.0/16", "Link-Local"),
+    ("fe80::/10", "Link-Local"),
+    ("100.64.0.0/10", "VPN"),           # CGNAT, used by Tailscale
+    ("fd7a:115c:a1e0::/48", "VPN"),     # Tailscale IPv6
+    ("fc00::/7", "ULA"),
+]
+
+# Prefix table per IP version: prefix length -> {network bits: scope}.
+# A lookup is one dict probe per distinct prefix length, longest first.
+_tables = {4: {}, 6: {}}
+_lengths = {4: [], 6: []}
+
+def add_network(cidr, scope):
+    net = ipaddress.ip_network(cidr, strict=False)
+    shift = net.max_prefixlen - net.prefixlen
+    _tables[net.version].setdefault(net.prefixlen, {})[int(net.network_address) >> shift] = scope
+    _lengths[net.version] = sorted(_tables[net.version], reverse=True)
+    classify_scope.cache_clear()
+
+def _parse_address(ip):
+    # -> (version, integer address); IPv4-mapped IPv6 counts as IPv4
+    ip = ip.split("%", 1)[0]
+    if ":" not in ip:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")
+    if value >> 32 == 0xFFFF:
+        return 4, value & 0xFFFFFFFF
+    return 6, value
+
+@lru_cache(maxsize=4096)
 def classify_scope(ip):
-    if ip.startswith("127.") or ip == "::1": return "Localhost"
-    if ip == "0.0.0.0" or ip == "::": return "All Interfaces"
-    if ip.startswith("192.168.") or ip.startswith("10."): return "LAN"
+    try:
+        version, value = _parse_address(ip)
+    except OSError:
+        return "Unknown"
+    bits = 32 if version == 4 else 128
+    table = _tables[version]
+    for length in _lengths[version]:
+        scope = table[length].get(value >> (bits - length))
+        if scope is not None: return scope
     return "Public"
+
+for cidr, scope in DEFAULT_NETWORKS:
+    add_network(cidr, scope)
+
+# Extra networks, e.g. SCOPE_NETWORKS="192.168.50.0/24=Lab,10.8.0.0/24=VPN"
+for item in os.environ.get("SCOPE_NETWORKS", "").split(","):
+    if "=" in item:
+        cidr, scope = item.split("=", 1)
+        add_network(cidr.strip(), scope.strip())
+
+# Previous interface counters: (monotonic time, {name: counters})
+_last_interfaces = (None, {})
+
+def interface_rates(counters):
+    # counters: name -> (rx bytes, rx packets, tx bytes, tx packets) totals;
+    # rates are per second since the previous call (None on the first)
+    global _last_interfaces
+    now = time.monotonic()
+    then, previous = _last_interfaces
+    _last_interfaces = (now, counters)
+    interfaces = []
+    for name, current in sorted(counters.items()):
+        entry = {"name": name, "rx_bytes": current[0], "tx_bytes": current[2]}
+        prev = previous.get(name)
+        for i, key in enumerate(("rx_bps", "rx_pps", "tx_bps", "tx_pps")):
+            if prev is None or now <= then:
+                entry[key] = None
+            else:
+                # Counters can wrap or reset when an interface is recreated
+                entry[key] = round(max(current[i] - prev[i], 0) / (now - then), 1)
+        interfaces.append(entry)
+    return interfaces
+
+# How many processes the process probes report
+TOP_PROCESSES = int(os.environ.get("TOP_PROCESSES", 5))
+
+# Reported by the backends' probes before their first result
+EMPTY_CONNECTIONS = {"established": 0, "states": {}, "by_port": [], "top_peers": []}
+EMPTY_SYSTEM = {"cpu_percent": None, "cores": [], "load": None, "memory": None,
+                "disks": [], "temperature": None, "thermal": []}
+
+def format_uptime(seconds):
+    if seconds is None: return "Unknown"
+    minutes = int(seconds // 60)
+    hours = minutes // 60
+    days = hours // 24
+    return f"{int(days)}d {int(hours % 24)}h {int(minutes % 60)}m"
@@ -45,7 +45,11 @@ try:
     
     # Test render_html if possible, or just trust monitoring tests
     # Mock data
-    health = {"uptime": "1d 2h", "status": "Online", "network": True, "dns": True, "processes": []}
+    health = {"uptime": "1d 2h", "status": "Online", "network": True, "dns": True, "processes": [], "cpu_processes": [],
+              "ping": {"reachable": True, "rtt_ms": 12.5, "loss": 0.0},
+              "resolvers": [{"server": "127.0.0.53", "name": "google.com", "ok": True, "rcode": "NOERROR", "ms": 4.2}],
+              "connections": {"established": 0, "states": {}, "by_port": [], "top_peers": []}, "interfaces": [],
+              "system": {"cpu_percent": None, "cores": [], "load": None, "memory": None, "disks": [], "temperature": None, "thermal": []}}
     ports = []
     html = html_dashboard.render_html(health, ports)
     if "1d 2h" in html:
@@ -0,0 +1,143 @@
+import struct
+
+# Just enough MessagePack (https://msgpack.org/) for the API's JSON-shaped
+# data: nil, bool, int, float64, str, array and map. Readable by any
+# msgpack library.
+CONTENT_TYPE = "application/msgpack"
+
+
+def pack(obj):
+    out = []
+    _pack(obj, out)
+    return b"".join(out)
+
+
+def _pack(obj, out):
+    if obj is None:
+        out.append(b"\xc0")
+    elif obj is True:
+        out.append(b"\xc3")
+    elif obj is False:
+        out.append(b"\xc2")
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            out.append(struct.pack("B", obj))
+        elif -32 <= obj < 0:
+            out.append(struct.pack("b", obj))
+        elif 0 <= obj < 2 ** 8:
+            out.append(struct.pack(">BB", 0xcc, obj))
+        elif 0 <= obj < 2 ** 16:
+            out.append(struct.pack(">BH", 0xcd, obj))
+        elif 0 <= obj < 2 ** 32:
+            out.append(struct.pack(">BI", 0xce, obj))
+        elif 0 <= obj < 2 ** 64:
+            out.append(struct.pack(">BQ", 0xcf, obj))
+        elif -2 ** 7 <= obj < 0:
+            out.append(struct.pack(">Bb", 0xd0, obj))
+        elif -2 ** 15 <= obj < 0:
+            out.append(struct.pack(">Bh", 0xd1, obj))
+        elif -2 ** 31 <= obj < 0:
+            out.append(struct.pack(">Bi", 0xd2, obj))
+        else:
+            out.append(struct.pack(">Bq", 0xd3, obj))
+    elif isinstance(obj, float):
+        out.append(struct.pack(">Bd", 0xcb, obj))
+    elif isinstance(obj, str):
+        data = obj.encode()
+        n = len(data)
+        if n < 32:
+            out.append(struct.pack("B", 0xa0 | n))
+        elif n < 2 ** 8:
+            out.append(struct.pack(">BB", 0xd9, n))
+        elif n < 2 ** 16:
+            out.append(struct.pack(">BH", 0xda, n))
+        else:
+            out.append(struct.pack(">BI", 0xdb, n))
+        out.append(data)
+    elif isinstance(obj, (list, tuple)):
+        _header(out, len(obj), 0x90, 0xdc)
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        _header(out, len(obj), 0x80, 0xde)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError(f"cannot pack {type(obj).__name__}")
+
+
+def _header(out, n, fix, code16):
+    # fixarray/fixmap, then the 16- and 32-bit length forms
+    if n < 16:
+        out.append(struct.pack("B", fix | n))
+    elif n < 2 ** 16:
+        out.append(struct.pack(">BH", code16, n))
+    else:
+        out.append(struct.pack(">BI", code16 + 1, n))
+
+
+# type byte -> (struct format, size) for the fixed-width scalars
+_SCALARS = {
+    0xca: (">f", 4), 0xcb: (">d", 8),
+    0xcc: (">B", 1), 0xcd: (">H", 2), 0xce: (">I", 4), 0xcf: (">Q", 8),
+    0xd0: (">b", 1), 0xd1: (">h", 2), 0xd2: (">i", 4), 0xd3: (">q", 8),
+}
+# type byte -> size of the length that follows, for str and containers
+_LENGTHS = {0xd9: 1, 0xda: 2, 0xdb: 4, 0xdc: 2, 0xdd: 4, 0xde: 2, 0xdf: 4}
+
+
+def unpack(data):
+    try:
+        obj, offset = _unpack(memoryview(data), 0)
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"truncated or corrupt msgpack data: {e}")
+    if offset != len(data):
+        raise ValueError("trailing data after msgpack object")
+    return obj
+
+
+def _unpack(data, offset):
+    code = data[offset]
+    offset += 1
+    if code < 0x80:
+        return code, offset
+    if code >= 0xe0:
+        return code - 0x100, offset
+    if code == 0xc0:
+        return None, offset
+    if code in (0xc2, 0xc3):
+        return code == 0xc3, offset
+    if code in _SCALARS:
+        fmt, size = _SCALARS[code]
+        return struct.unpack_from(fmt, data, offset)[0], offset + size
+
+    if 0xa0 <= code <= 0xbf:
+        kind, n = "str", code & 0x1f
+    elif 0x90 <= code <= 0x9f:
+        kind, n = "array", code & 0x0f
+    elif 0x80 <= code <= 0x8f:
+        kind, n = "map", code & 0x0f
+    elif code in _LENGTHS:
+        size = _LENGTHS[code]
+        n = int.from_bytes(data[offset:offset + size], "big")
+        offset += size
+        kind = "str" if code <= 0xdb else "array" if code <= 0xdd else "map"
+    else:
+        raise ValueError(f"unsupported msgpack type 0x{code:02x}")
+
+    if kind == "str":
+        if offset + n > len(data):
+            raise IndexError("string runs past the end")
+        return str(data[offset:offset + n], "utf-8"), offset + n
+    if kind == "array":
+        items = []
+        for _ in range(n):
+            item, offset = _unpack(data, offset)
+            items.append(item)
+        return items, offset
+    result = {}
+    for _ in range(n):
+        key, offset = _unpack(data, offset)
+        result[key], offset = _unpack(data, offset)
+    return result, offset